@@ -5,7 +5,7 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django.core.exceptions import ValidationError
 
-from .models import User, Otp
+from .models import User, Otp, EmailOutbox, DashboardStats
 
 
 class UserCreationForm(forms.ModelForm):
@@ -85,6 +85,8 @@ class UserAdmin(BaseUserAdmin):
 # Now register the new UserAdmin...
 admin.site.register(User, UserAdmin)
 admin.site.register(Otp)
+admin.site.register(EmailOutbox)
+admin.site.register(DashboardStats)
 # ... and, since we're not using Django's built-in permissions,
 # unregister the Group model from admin.
 admin.site.unregister(Group)
\ No newline at end of file
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import AnonymousUser
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from .authentication import CachedJWTAuthentication
+
+
+def render(response):
+    """Render a DRF Response outside APIView, the way api_view would."""
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = 'application/json'
+    response.renderer_context = {}
+    return response.render()
+
+
+def _parse_body(request):
+    if request.method in ('GET', 'HEAD', 'OPTIONS', 'DELETE'):
+        return {}
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise exceptions.ParseError(f"JSON parse error - {exc}")
+    return request.POST
+
+
+def _handle_exception(exc, request):
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        exc.auth_header = CachedJWTAuthentication().authenticate_header(request)
+    response = exception_handler(exc, {'request': request})
+    if response is None:
+        raise exc
+    if getattr(exc, 'auth_header', None):
+        response['WWW-Authenticate'] = exc.auth_header
+    return render(response)
+
+
+def async_api_view(methods, authenticate=False, permission_classes=()):
+    """
+    ``@api_view`` for ``async def`` views. DRF views are sync only, so this
+    does the parts of APIView our views rely on: method check, JSON/form
+    body as ``request.data``, CachedJWTAuthentication in a worker thread,
+    permission classes, DRF exception handling and rendering of returned
+    ``Response`` objects to JSON.
+    """
+    allowed = {method.upper() for method in methods}
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            try:
+                if request.method not in allowed:
+                    raise exceptions.MethodNotAllowed(request.method)
+                request.data = _parse_body(request)
+                # never fall back to the lazy session user, it queries synchronously
+                request.user, request.auth = AnonymousUser(), None
+                if authenticate:
+                    result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+                    if result is not None:
+                        request.user, request.auth = result
+                for permission in (cls() for cls in permission_classes):
+                    if not permission.has_permission(request, None):
+                        if authenticate and request.auth is None:
+                            raise exceptions.NotAuthenticated()
+                        raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+                response = await view(request, *args, **kwargs)
+            except Exception as exc:
+                return _handle_exception(exc, request)
+            if isinstance(response, Response):
+                return render(response)
+            return response
+        wrapped.csrf_exempt = True
+        return wrapped
+    return decorator
+
+
+_hash_executor = None
+
+
+def get_hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        workers = getattr(settings, 'PASSWORD_HASH_THREADS', None) or os.cpu_count() or 2
+        _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _hash_executor
+
+
+async def acheck_password(user, raw_password):
+    """
+    Verify a password on the hashing pool. PBKDF2 releases the GIL, so
+    concurrent sign-ins hash in parallel while the event loop keeps serving.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), check_password, raw_password, user.password)
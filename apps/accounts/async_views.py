@@ -0,0 +1,59 @@
+"""
+Async sign-in for ASGI deployments, same payload as views.signin. urls.py
+routes to it when ASYNC_VIEWS is on (see docs/asgi.md).
+"""
+from rest_framework import status
+from rest_framework.response import Response
+
+from .async_api import acheck_password, async_api_view
+from .models import User
+from .ratelimit import rate_limit
+from .serializers import signInSerializer
+from .utils import get_tokens_for_user
+
+
+@async_api_view(['POST'])
+@rate_limit('signin')
+async def signin(request):
+    serializer = signInSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    email = serializer.validated_data.get('email')
+    password = serializer.validated_data.get('password')
+
+    user = await User.objects.filter(email=email).afirst()
+    if not user:
+        return Response(
+            {"message": "Invalid email or password."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    if not user.is_active:
+        return Response(
+            {"message": "Your account is not active. Please verify your email or wait for admin approval."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    # PBKDF2 runs on the hashing pool instead of blocking the event loop
+    if not await acheck_password(user, password):
+        return Response(
+            {"message": "Invalid email or password."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    token = get_tokens_for_user(user)
+
+    return Response(
+        {
+            "access": token["access_token"],
+            "refresh": token["refresh_token"],
+            "user": {
+                "id": user.id,
+                "name": user.name,
+                "email": user.email,
+                "role": user.role,
+                "is_superuser": user.is_superuser,
+                "is_staff": user.is_staff,
+                "is_active": user.is_active,
+                "is_lender": user.is_lender,
+                "is_borrower": user.is_borrower,
+            }
+        },
+        status=status.HTTP_200_OK
+    )
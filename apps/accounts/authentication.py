@@ -16,4 +16,65 @@
 #         try:
 #             return User.objects.get(pk=user_id)
 #         except User.DoesNotExist:
-#             return None
\ No newline at end of file
+#             return None
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.books.cache import get_response_cache, invalidate_tags, is_process_local, tag_versions
+
+
+# never cached, loaded lazily on the rare request that needs it
+UNCACHED_FIELDS = {'password'}
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    """Drop the cached user once the current transaction commits."""
+    invalidate_tags(user_tag(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from the response cache
+    instead of one query per request. Entries live for AUTH_USER_CACHE_TIMEOUT
+    seconds and are keyed by the ``user:<id>`` tag version, which every User
+    save bumps (apps/accounts/signals.py), so deactivation, promotion and
+    password changes apply on the next request. The invalidation only
+    reaches other workers through a shared cache backend, so with a
+    process-local one (locmem, dummy) users are read from the database.
+    """
+
+    def get_user(self, validated_token):
+        cache = get_response_cache()
+        if api_settings.CHECK_REVOKE_TOKEN or is_process_local(cache):
+            # the revoke check needs the password hash, which is not cached;
+            # a process-local cache would miss other workers' invalidations
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken("Token contained no recognizable user identification") from exc
+
+        version, = tag_versions([user_tag(user_id)])
+        key = f'auth-user:{user_id}:{version}'
+        values = cache.get(key)
+        if values is None:
+            fields = [f.attname for f in self.user_model._meta.concrete_fields if f.attname not in UNCACHED_FIELDS]
+            values = (
+                self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .values(*fields).first()
+            )
+            if values is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            cache.set(key, values, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+
+        user = self.user_model.from_db('default', list(values), list(values.values()))
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
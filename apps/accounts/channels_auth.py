@@ -0,0 +1,37 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from .authentication import CachedJWTAuthentication
+
+
+def _raw_token(scope):
+    # browsers can't set headers on a WebSocket, so accept ?token= as well
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] == 'Bearer':
+                return parts[1]
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    return token[0] if token else None
+
+
+@database_sync_to_async
+def _user_for(raw_token):
+    authenticator = CachedJWTAuthentication()
+    try:
+        return authenticator.get_user(authenticator.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Set ``scope['user']`` from the same access tokens the REST API takes."""
+
+    async def __call__(self, scope, receive, send):
+        raw_token = _raw_token(scope)
+        scope = dict(scope, user=await _user_for(raw_token) if raw_token else AnonymousUser())
+        return await super().__call__(scope, receive, send)
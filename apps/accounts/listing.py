@@ -0,0 +1,100 @@
+import datetime
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from apps.books.pagination import KeysetPagination
+
+from .serializers import UserListSerializer
+
+
+NEWEST_ORDERING = ('-date_joined', '-id')
+OLDEST_ORDERING = ('date_joined', 'id')
+
+LIST_FIELDS = ('id', 'name', 'email', 'role', 'is_active', 'is_lender', 'is_borrower', 'date_joined')
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def _boolean(params, name):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return BOOLEAN_VALUES[value.lower()]
+    except KeyError:
+        raise ValidationError({name: "Use true or false."})
+
+
+def _moment(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: "Use an ISO 8601 date or datetime."})
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_users(queryset, params):
+    """
+    Apply the admin listing filters: ``role``, ``is_lender``, ``is_borrower``,
+    ``is_active``, ``joined_after``, ``joined_before`` and an ``email`` prefix.
+    """
+    role = params.get('role')
+    if role:
+        if role.upper() not in ('ADMIN', 'USER'):
+            raise ValidationError({'role': "Use ADMIN or USER."})
+        queryset = queryset.filter(role=role.upper())
+    for flag in ('is_lender', 'is_borrower', 'is_active'):
+        value = _boolean(params, flag)
+        if value is not None:
+            queryset = queryset.filter(**{flag: value})
+    joined_after = _moment(params, 'joined_after')
+    if joined_after:
+        queryset = queryset.filter(date_joined__gte=joined_after)
+    joined_before = _moment(params, 'joined_before')
+    if joined_before:
+        queryset = queryset.filter(date_joined__lt=joined_before)
+    email = (params.get('email') or '').strip()
+    if email:
+        # a range rather than startswith: sqlite's LIKE is case-insensitive
+        # and can't use the unique email index, a range seeks it (and is
+        # case-sensitive under a binary collation)
+        upper = email[:-1] + chr(ord(email[-1]) + 1)
+        queryset = queryset.filter(email__gte=email, email__lt=upper)
+    return queryset
+
+
+def user_counts(queryset):
+    """Breakdown of the whole filtered set in one conditional-aggregate query."""
+    return queryset.order_by().aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        inactive=Count('id', filter=Q(is_active=False)),
+        lenders=Count('id', filter=Q(is_lender=True)),
+        borrowers=Count('id', filter=Q(is_borrower=True)),
+        admins=Count('id', filter=Q(role='ADMIN')),
+    )
+
+
+def user_listing(request, queryset, ordering=NEWEST_ORDERING):
+    """
+    Keyset-paginated, filtered user listing. The first page carries
+    ``counts`` for the whole filtered set, one aggregate next to the page
+    query; ``?counts=false`` leaves them out.
+    """
+    queryset = filter_users(queryset, request.query_params)
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_queryset(queryset.only(*LIST_FIELDS), request)
+    response = paginator.get_paginated_response(UserListSerializer(page, many=True).data)
+    if _boolean(request.query_params, 'counts') is not False and paginator.cursor_query_param not in request.query_params:
+        response.data['counts'] = user_counts(queryset)
+    return response
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.outbox import drain_outbox, purge_sent
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails in batches over one reused connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of draining once.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between polls when idle.")
+        parser.add_argument('--purge-after-days', type=int, default=7, help="Delete sent emails older than this.")
+
+    def handle(self, *args, **options):
+        purged = purge_sent(timedelta(days=options['purge_after_days']))
+        if purged:
+            self.stdout.write(f"Purged {purged} sent emails")
+
+        while True:
+            sent = failed = 0
+            while True:
+                batch_sent, batch_failed = drain_outbox(batch_size=options['batch_size'])
+                sent += batch_sent
+                failed += batch_failed
+                if batch_sent + batch_failed < options['batch_size']:
+                    break
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} emails, {failed} failed"))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
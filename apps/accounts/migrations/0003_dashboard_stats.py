@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_users', models.IntegerField(default=0)),
+                ('inactive_users', models.IntegerField(default=0)),
+                ('lenders', models.IntegerField(default=0)),
+                ('borrowers', models.IntegerField(default=0)),
+                ('admins', models.IntegerField(default=0)),
+                ('books', models.IntegerField(default=0)),
+                ('categories', models.IntegerField(default=0)),
+                ('pending_requests', models.IntegerField(default=0)),
+                ('active_loans', models.IntegerField(default=0)),
+                ('overdue_loans', models.IntegerField(default=0)),
+                ('returned_loans', models.IntegerField(default=0)),
+                ('recounted_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'dashboard stats',
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from .managers import CustomerUserManager
 
@@ -17,6 +18,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='USER')
     is_lender = models.BooleanField(default=False)
     is_borrower = models.BooleanField(default=False)
+    date_joined = models.DateTimeField(default=timezone.now)
 
     objects = CustomerUserManager()
 
@@ -28,6 +30,12 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     class Meta:
         ordering = ['-id']
+        indexes = [
+            # admin listings: keyset pages on (date_joined, id), optionally
+            # narrowed to the active or inactive (approval queue) users
+            models.Index(fields=['date_joined', 'id'], name='user_joined_idx'),
+            models.Index(fields=['is_active', 'date_joined', 'id'], name='user_active_joined_idx'),
+        ]
 
 
 class Otp(models.Model):
@@ -43,3 +51,58 @@ class Otp(models.Model):
     class Meta:
         ordering = ['-created_at']
         
+
+
+class EmailOutbox(models.Model):
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('DEAD', 'Dead'),
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    # blanked once the email is sent or dead-lettered, e.g. for one-time codes
+    sensitive = models.BooleanField(default=False)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True, default='')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.status})"
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+
+class DashboardStats(models.Model):
+    """
+    Single materialized row behind dashboard_stats. Kept current by the
+    signals in apps/accounts/signals.py and corrected by recount_dashboard_stats.
+    """
+    active_users = models.IntegerField(default=0)
+    inactive_users = models.IntegerField(default=0)
+    lenders = models.IntegerField(default=0)
+    borrowers = models.IntegerField(default=0)
+    admins = models.IntegerField(default=0)
+    books = models.IntegerField(default=0)
+    categories = models.IntegerField(default=0)
+    pending_requests = models.IntegerField(default=0)
+    active_loans = models.IntegerField(default=0)
+    overdue_loans = models.IntegerField(default=0)
+    returned_loans = models.IntegerField(default=0)
+    recounted_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "dashboard stats"
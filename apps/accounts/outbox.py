@@ -0,0 +1,147 @@
+import smtplib
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+
+def enqueue_email(subject, body, to, from_email=None, sensitive=False):
+    """
+    Queue an email in the outbox. Call it inside the transaction of the
+    change that triggers the email, so the email exists iff the change
+    commits. The send_outbox_emails worker delivers it. The body of a
+    ``sensitive`` email is blanked as soon as it leaves the outbox.
+    """
+    if isinstance(to, str):
+        to = [to]
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        sensitive=sensitive,
+        to=list(to),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def enqueue_emails(messages, batch_size=500):
+    """
+    Queue many ``(subject, body, to)`` emails with bulk INSERTs, same
+    transaction rules as enqueue_email. Returns how many were queued.
+    """
+    emails = [
+        EmailOutbox(
+            subject=subject,
+            body=body,
+            to=[to] if isinstance(to, str) else list(to),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+        )
+        for subject, body, to in messages
+    ]
+    return len(EmailOutbox.objects.bulk_create(emails, batch_size=batch_size))
+
+
+def backoff(attempts):
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_SECONDS', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 6 * 60 * 60))
+
+
+def claim_batch(batch_size, stale_after=timedelta(minutes=10)):
+    """
+    Claim up to ``batch_size`` due emails for this worker. Claiming is a
+    conditional UPDATE, so concurrent workers never send the same row, and
+    rows left in SENDING by a crashed worker are reclaimed after ``stale_after``.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    EmailOutbox.objects.filter(status='SENDING', claimed_at__lt=now - stale_after).update(status='PENDING')
+    ids = list(
+        EmailOutbox.objects.filter(status='PENDING', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    EmailOutbox.objects.filter(id__in=ids, status='PENDING').update(status='SENDING', claimed_by=token, claimed_at=now)
+    return list(EmailOutbox.objects.filter(claimed_by=token, status='SENDING').order_by('next_attempt_at', 'id'))
+
+
+def _finish(email, status, *fields):
+    email.status = status
+    fields = ['status', *fields]
+    if email.sensitive and status in ('SENT', 'DEAD'):
+        email.body = ''
+        fields.append('body')
+    email.save(update_fields=fields)
+
+
+def _retry(email, exc, max_attempts):
+    email.attempts += 1
+    email.last_error = f"{type(exc).__name__}: {exc}"
+    if email.attempts >= max_attempts:
+        _finish(email, 'DEAD', 'attempts', 'last_error')
+    else:
+        email.next_attempt_at = timezone.now() + backoff(email.attempts)
+        _finish(email, 'PENDING', 'attempts', 'last_error', 'next_attempt_at')
+
+
+def drain_outbox(batch_size=100, connection=None):
+    """
+    Send one batch of due emails over a single reused backend connection.
+    Failed sends are retried with exponential backoff and dead-lettered
+    after EMAIL_OUTBOX_MAX_ATTEMPTS; when the connection can't be opened
+    the whole batch backs off. Returns ``(sent, failed)``.
+    """
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+    try:
+        try:
+            connection.open()
+        except (smtplib.SMTPException, socket.error) as exc:
+            for email in emails:
+                _retry(email, exc, max_attempts)
+            return 0, len(emails)
+        for index, email in enumerate(emails):
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email,
+                to=email.to,
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except (smtplib.SMTPException, socket.error) as exc:
+                failed += 1
+                _retry(email, exc, max_attempts)
+                if isinstance(exc, smtplib.SMTPServerDisconnected):
+                    connection.close()
+                    try:
+                        connection.open()
+                    except (smtplib.SMTPException, socket.error) as exc:
+                        for rest in emails[index + 1:]:
+                            _retry(rest, exc, max_attempts)
+                        return sent, failed + len(emails) - index - 1
+                continue
+            sent += 1
+            email.sent_at = timezone.now()
+            email.attempts += 1
+            _finish(email, 'SENT', 'sent_at', 'attempts')
+    finally:
+        connection.close()
+        # anything still claimed (the worker died mid-batch) goes back
+        EmailOutbox.objects.filter(id__in=[e.id for e in emails], status='SENDING').update(status='PENDING')
+    return sent, failed
+
+
+def purge_sent(older_than):
+    return EmailOutbox.objects.filter(status='SENT', sent_at__lt=timezone.now() - older_than).delete()[0]
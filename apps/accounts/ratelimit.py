@@ -0,0 +1,210 @@
+import functools
+import hashlib
+import inspect
+import math
+import random
+import sqlite3
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.books.cache import is_process_local
+
+
+# scope -> [(key, limit, window seconds)], overridable through RATE_LIMITS
+DEFAULT_POLICIES = {
+    'signin': [('ip', 20, 60), ('email', 5, 300)],
+    'sign_up': [('ip', 10, 3600)],
+    'forgot_password': [('ip', 10, 3600), ('email', 3, 3600)],
+    'verify_otp': [('ip', 20, 600), ('email', 5, 600)],
+    'borrow_request': [('user', 20, 3600)],
+}
+
+
+class CacheBackend:
+    """
+    Counters in a Django cache alias. Use a backend every worker shares
+    (Redis, Memcached, database or file cache) in multi-process deployments;
+    a locmem cache only limits within one process.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+        # in-memory counters are cheap enough to check on the event loop
+        self.process_local = is_process_local(self.cache)
+
+    def hit(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # expired between add() and incr()
+            self.cache.set(key, 1, timeout)
+            return 1
+
+    def get(self, key):
+        return self.cache.get(key, 0)
+
+
+class SQLiteBackend:
+    """
+    Counters in a small WAL-mode SQLite file shared by every worker process
+    on the host, one upsert per hit. Expired rows are purged now and then.
+    """
+    process_local = False
+
+    def __init__(self):
+        self.path = str(getattr(settings, 'RATE_LIMIT_SQLITE_PATH', settings.BASE_DIR / 'ratelimit.sqlite3'))
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS hits (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)'
+            )
+            self.local.connection = connection
+        return connection
+
+    def hit(self, key, timeout):
+        now = time.time()
+        if random.random() < 0.001:
+            self.connection.execute('DELETE FROM hits WHERE expires < ?', (now,))
+        row = self.connection.execute(
+            'INSERT INTO hits (key, count, expires) VALUES (?, 1, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            'count = CASE WHEN expires < ? THEN 1 ELSE count + 1 END, '
+            'expires = CASE WHEN expires < ? THEN excluded.expires ELSE expires END '
+            'RETURNING count',
+            (key, now + timeout, now, now),
+        ).fetchone()
+        return row[0]
+
+    def get(self, key):
+        row = self.connection.execute(
+            'SELECT count FROM hits WHERE key = ? AND expires >= ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'RATE_LIMIT_BACKEND', 'apps.accounts.ratelimit.SQLiteBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def get_policies(scope):
+    return getattr(settings, 'RATE_LIMITS', {}).get(scope, DEFAULT_POLICIES.get(scope, []))
+
+
+def client_ip(request):
+    header = getattr(settings, 'RATE_LIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        # the proxy appends the client it saw last, e.g. X-Forwarded-For
+        return request.META[header].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identity(request, key):
+    if key == 'ip':
+        return client_ip(request)
+    if key == 'user':
+        return str(request.user.pk) if request.user.is_authenticated else None
+    if key == 'email':
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return str(email).strip().lower() if email else None
+    raise ValueError(f"Unknown rate limit key: {key}")
+
+
+def check(scope, key, ident, limit, window, backend=None):
+    """
+    Count one hit against a sliding window approximated from two fixed
+    windows: the previous window's count weighted by how much of it still
+    overlaps, plus the current count. Returns seconds to wait, 0 if allowed.
+    """
+    backend = backend or get_backend()
+    now = time.time()
+    current = int(now // window)
+    elapsed = now - current * window
+    digest = hashlib.md5(ident.encode()).hexdigest()[:16]
+    prefix = f'rl:{scope}:{key}:{digest}:{window}'
+
+    count = backend.hit(f'{prefix}:{current}', window * 2)
+    if count > limit:
+        # this window is spent, and once it rolls over its count still has
+        # to decay below the limit for the next hit to pass
+        return math.ceil(window - elapsed + window * (1 - (limit - 1) / count))
+    previous = backend.get(f'{prefix}:{current - 1}')
+
+    weight = 1 - elapsed / window
+    if previous * weight + count <= limit:
+        return 0
+    # wait until the previous window's share has decayed enough
+    needed = (previous - (limit - count)) / previous
+    return max(1, math.ceil(window * needed - elapsed))
+
+
+def blocked_response(scope, request):
+    if not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+        return None
+    for key, limit, window in get_policies(scope):
+        ident = identity(request, key)
+        if ident is None:
+            continue
+        retry_after = check(scope, key, ident, limit, window)
+        if retry_after:
+            return Response(
+                {"message": f"Too many requests. Try again in {retry_after} seconds."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(retry_after)},
+            )
+    return None
+
+
+def rate_limit(scope):
+    """
+    Reject a DRF view with 429 and ``Retry-After`` once any policy of
+    ``scope`` is exceeded. Apply it below ``@api_view`` (or
+    ``@async_api_view``) so request.user and request.data are available.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                if get_backend().process_local:
+                    # in-memory counters, cheaper inline than a thread hop
+                    blocked = blocked_response(scope, request)
+                else:
+                    # file or network I/O must not block the event loop
+                    blocked = await sync_to_async(blocked_response)(scope, request)
+                if blocked is not None:
+                    return blocked
+                return await view(request, *args, **kwargs)
+            return awrapped
+
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            blocked = blocked_response(scope, request)
+            if blocked is not None:
+                return blocked
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
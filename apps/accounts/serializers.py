@@ -7,6 +7,12 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ["id", "name", "email", "location", "is_active", "is_superuser", "is_borrower", "is_borrower"]
 
+class UserListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ["id", "name", "email", "role", "is_active", "is_lender", "is_borrower", "date_joined"]
+
+
 class SignUpSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
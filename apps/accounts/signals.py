@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+
+from django.dispatch import receiver
+
+from . import authentication, stats
+from .models import User
+
+
+# dashboard stats, see apps/accounts/stats.py
+def remember_tracked(sender, instance, **kwargs):
+    # read through __dict__ so deferred (.only()) rows don't load the fields
+    fields = stats.TRACKED_FIELDS[sender]
+    if all(field in instance.__dict__ for field in fields):
+        instance._stats_loaded = {field: instance.__dict__[field] for field in fields}
+    else:
+        instance._stats_loaded = None
+
+
+def _loaded_values(sender, instance):
+    loaded = getattr(instance, '_stats_loaded', None)
+    if loaded is None and instance.pk is not None:
+        loaded = sender._base_manager.filter(pk=instance.pk).values(*stats.TRACKED_FIELDS[sender]).first()
+    return loaded
+
+
+def load_previous(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._stats_before = None if instance._state.adding else _loaded_values(sender, instance)
+
+
+def count_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    fields = stats.TRACKED_FIELDS[sender]
+    current = {field: getattr(instance, field) for field in fields}
+    deltas = stats.row_metrics(sender, current)
+    before = getattr(instance, '_stats_before', None)
+    if before is not None:
+        for name, value in stats.row_metrics(sender, before).items():
+            deltas[name] -= value
+    stats.adjust(deltas)
+    instance._stats_loaded = current
+
+
+def count_deleted(sender, instance, **kwargs):
+    before = getattr(instance, '_stats_before', None)
+    if before is not None:
+        stats.adjust({name: -value for name, value in stats.row_metrics(sender, before).items()})
+
+
+def load_deleted(sender, instance, **kwargs):
+    instance._stats_before = _loaded_values(sender, instance)
+
+
+for model in stats.TRACKED_FIELDS:
+    post_init.connect(remember_tracked, sender=model, dispatch_uid=f'stats_init_{model.__name__}')
+    pre_save.connect(load_previous, sender=model, dispatch_uid=f'stats_pre_save_{model.__name__}')
+    post_save.connect(count_saved, sender=model, dispatch_uid=f'stats_save_{model.__name__}')
+    pre_delete.connect(load_deleted, sender=model, dispatch_uid=f'stats_pre_delete_{model.__name__}')
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f'stats_delete_{model.__name__}')
+
+
+# cached JWT users, see apps/accounts/authentication.py
+@receiver([post_save, post_delete], sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    authentication.invalidate_cached_user(instance.pk)
@@ -0,0 +1,148 @@
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from apps.books.models import Book, BorrowRequest, Catregory
+
+from .models import DashboardStats, User
+
+
+STATS_ID = 1
+
+# model -> fields its metrics depend on
+TRACKED_FIELDS = {
+    User: ('is_active', 'is_lender', 'is_borrower', 'role'),
+    Book: (),
+    Catregory: (),
+    BorrowRequest: ('status', 'is_late'),
+}
+
+
+def _user_metrics(values, now):
+    active = values['is_active']
+    return {
+        'active_users': active,
+        'inactive_users': not active,
+        'lenders': active and values['is_lender'],
+        'borrowers': active and values['is_borrower'],
+        'admins': values['role'] == 'ADMIN',
+    }
+
+
+def _loan_metrics(values, now):
+    accepted = values['status'] == 'ACCEPTED'
+    return {
+        'pending_requests': values['status'] == 'PENDING',
+        'active_loans': accepted,
+        # flagged by mark_overdue_loans, a row crossing its deadline isn't a
+        # write the counters could see
+        'overdue_loans': accepted and values['is_late'],
+        'returned_loans': values['status'] == 'RETURNED',
+    }
+
+
+METRICS = {
+    User: _user_metrics,
+    Book: lambda values, now: {'books': True},
+    Catregory: lambda values, now: {'categories': True},
+    BorrowRequest: _loan_metrics,
+}
+
+
+def row_metrics(model, values, now=None):
+    """What one row with ``values`` contributes to each counter, as 0/1."""
+    return {name: int(bool(flag)) for name, flag in METRICS[model](values, now or timezone.now()).items()}
+
+
+def live_stats():
+    """
+    Count everything with conditional aggregates: one query per table, each
+    a single scan, no matter how many metrics the dashboard shows.
+    """
+    stats = User.objects.aggregate(
+        active_users=Count('id', filter=Q(is_active=True)),
+        inactive_users=Count('id', filter=Q(is_active=False)),
+        lenders=Count('id', filter=Q(is_active=True, is_lender=True)),
+        borrowers=Count('id', filter=Q(is_active=True, is_borrower=True)),
+        admins=Count('id', filter=Q(role='ADMIN')),
+    )
+    stats.update(Book.objects.aggregate(books=Count('id')))
+    stats.update(Catregory.objects.aggregate(categories=Count('id')))
+    stats.update(BorrowRequest.objects.aggregate(
+        pending_requests=Count('id', filter=Q(status='PENDING')),
+        active_loans=Count('id', filter=Q(status='ACCEPTED')),
+        overdue_loans=Count('id', filter=Q(status='ACCEPTED', is_late=True)),
+        returned_loans=Count('id', filter=Q(status='RETURNED')),
+    ))
+    return stats
+
+
+def recount():
+    """
+    Rewrite the materialized row from live_stats(). Returns ``(stats, drift)``
+    where drift maps each counter that was off to ``stored - actual``.
+    """
+    stats = live_stats()
+    now = timezone.now()
+    previous = DashboardStats.objects.filter(pk=STATS_ID).values(*stats).first() or {}
+    DashboardStats.objects.update_or_create(
+        pk=STATS_ID, defaults={**stats, 'recounted_at': now, 'updated_at': now},
+    )
+    drift = {name: previous[name] - value for name, value in stats.items() if previous and previous[name] != value}
+    return stats, drift
+
+
+def adjust(deltas):
+    """
+    Apply counter deltas to the materialized row with F() increments in the
+    caller's transaction, so they commit or roll back with the change.
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return
+    updated = DashboardStats.objects.filter(pk=STATS_ID).update(
+        updated_at=timezone.now(), **{name: F(name) + value for name, value in deltas.items()}
+    )
+    if not updated:
+        # first write ever, or the row was deleted: count the current state
+        recount()
+
+
+def get_stats():
+    """The materialized row as a dict, created with a recount on first use."""
+    row = DashboardStats.objects.filter(pk=STATS_ID).values().first()
+    if row is None:
+        recount()
+        row = DashboardStats.objects.filter(pk=STATS_ID).values().first()
+    row.pop('id')
+    return row
+
+
+def dashboard_payload(stats):
+    books_on_loan = stats['active_loans']
+    return {
+        # original keys, kept for existing clients
+        "total_users": stats['active_users'],
+        "total_lenders": stats['lenders'],
+        "total_borrowers": stats['borrowers'],
+        "users": {
+            "active": stats['active_users'],
+            "inactive": stats['inactive_users'],
+            "lenders": stats['lenders'],
+            "borrowers": stats['borrowers'],
+            "admins": stats['admins'],
+        },
+        "books": {
+            "total": stats['books'],
+            "available": max(stats['books'] - books_on_loan, 0),
+            "on_loan": books_on_loan,
+            "categories": stats['categories'],
+        },
+        "borrows": {
+            "pending": stats['pending_requests'],
+            "active": stats['active_loans'],
+            "overdue": max(stats['overdue_loans'], 0),
+            "returned": stats['returned_loans'],
+        },
+        "recounted_at": stats.get('recounted_at'),
+        "updated_at": stats.get('updated_at'),
+    }
@@ -1,3 +1,203 @@
-from django.test import TestCase
+import asyncio
+import os
+import smtplib
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.books.models import Book
+
+from . import ratelimit
+from .models import EmailOutbox, User
+from .outbox import drain_outbox, enqueue_email
+from .listing import filter_users
+from .stats import get_stats, live_stats
+
+
+class UnreachableConnection:
+    def open(self):
+        raise ConnectionRefusedError(111, 'Connection refused')
+
+    def close(self):
+        pass
+
+
+class DroppingConnection:
+    """Sends fine until the server hangs up, then can't reconnect."""
+
+    def __init__(self):
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+        if self.opened > 1:
+            raise smtplib.SMTPConnectError(421, 'try later')
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected('gone')
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.emails = [enqueue_email('Hi', f'body {i}', f'user{i}@example.com') for i in range(3)]
+
+    def rows(self):
+        return list(EmailOutbox.objects.order_by('id').values_list('status', 'attempts'))
+
+    def test_unreachable_server_backs_off_the_claimed_batch(self):
+        self.assertEqual(drain_outbox(connection=UnreachableConnection()), (0, 3))
+        self.assertEqual(self.rows(), [('PENDING', 1)] * 3)
+        self.assertTrue(all('ConnectionRefusedError' in e.last_error for e in EmailOutbox.objects.all()))
+        # backed off, so the next tick claims nothing
+        self.assertEqual(drain_outbox(connection=UnreachableConnection()), (0, 0))
+
+    def test_failed_reconnect_backs_off_the_rest_of_the_batch(self):
+        self.assertEqual(drain_outbox(connection=DroppingConnection()), (0, 3))
+        self.assertEqual(self.rows(), [('PENDING', 1)] * 3)
+
+    def test_sensitive_body_is_blanked_once_sent(self):
+        otp = enqueue_email('Your OTP Code', 'Your OTP code is: 123456.', 'a@example.com', sensitive=True)
+        self.assertEqual(drain_outbox(connection=get_connection('django.core.mail.backends.locmem.EmailBackend')), (4, 0))
+        self.assertIn('123456', mail.outbox[-1].body)
+        otp.refresh_from_db()
+        self.assertEqual((otp.status, otp.body), ('SENT', ''))
+        self.assertEqual(EmailOutbox.objects.get(pk=self.emails[0].pk).body, 'body 0')
+
+
+class LiveStatsTests(TestCase):
+    def test_counts_each_table_in_one_query(self):
+        lender = User.objects.create_user(name='a', email='a@example.com', password='pw', is_active=True, is_lender=True)
+        User.objects.create_user(name='b', email='b@example.com', password='pw', role='ADMIN')
+        Book.objects.create(title='Dune', author='x', owner=lender, language='en')
+        with self.assertNumQueries(4):
+            stats = live_stats()
+        self.assertEqual(
+            {name: stats[name] for name in ('active_users', 'inactive_users', 'lenders', 'admins', 'books', 'pending_requests')},
+            {'active_users': 1, 'inactive_users': 1, 'lenders': 1, 'admins': 1, 'books': 1, 'pending_requests': 0},
+        )
+        # the signal-maintained counters agree with the recount
+        self.assertEqual({name: value for name, value in get_stats().items() if name in stats}, stats)
+
+
+class UserListingTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(name='root', email='root@example.com', password='pw', is_superuser=True)
+        for name in ('anna', 'ann', 'Annie', 'bob'):
+            User.objects.create_user(name=name, email=f'{name}@example.com', password='pw', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def test_first_page_carries_the_counts(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/accounts/all-user/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['counts']['total'], response.data['counts']['active']), (4, 4))
+        # later pages and ?counts=false skip the aggregate
+        response = self.client.get(response.data['next'])
+        self.assertNotIn('counts', response.data)
+        response = self.client.get('/api/v1/accounts/all-user/', {'counts': 'false'})
+        self.assertNotIn('counts', response.data)
+
+    def test_email_prefix_is_an_index_range(self):
+        users = filter_users(User.objects.all(), {'email': 'ann'})
+        self.assertEqual(sorted(users.values_list('email', flat=True)), ['ann@example.com', 'anna@example.com'])
+        self.assertIn('SEARCH', users.explain())
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            name='root', email='root@example.com', password='pw', is_active=True, is_superuser=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def status(self):
+        # without counts the listing itself is a single query
+        return self.client.get('/api/v1/accounts/active-users/', {'counts': 'false'}).status_code
+
+    def test_process_local_cache_reads_the_user_every_time(self):
+        self.assertEqual(self.status(), 200)
+        # another worker deactivates the user: nothing reaches this process's cache
+        User.objects.filter(pk=self.admin.pk).update(is_active=False)
+        self.assertEqual(self.status(), 401)
+
+    def test_shared_cache_serves_the_user(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            self.assertEqual(self.status(), 200)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.status(), 200)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.admin.is_active = False
+                self.admin.save()
+            self.assertEqual(self.status(), 401)
+
+
+class RecordingBackend(ratelimit.CacheBackend):
+    def __init__(self, process_local):
+        super().__init__()
+        self.process_local = process_local
+        self.on_event_loop = set()
+
+    def hit(self, key, timeout):
+        try:
+            asyncio.get_running_loop()
+            self.on_event_loop.add(True)
+        except RuntimeError:
+            self.on_event_loop.add(False)
+        return super().hit(key, timeout)
+
+
+@override_settings(RATE_LIMITS={'test': [('ip', 2, 60)]})
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def sqlite_backend(self):
+        with override_settings(RATE_LIMIT_SQLITE_PATH=os.path.join(self.directory.name, 'ratelimit.sqlite3')):
+            return ratelimit.SQLiteBackend()
+
+    def test_workers_on_one_host_share_the_sqlite_counters(self):
+        first, second = self.sqlite_backend(), self.sqlite_backend()
+        self.assertEqual(ratelimit.check('test', 'ip', '10.0.0.1', 2, 60, backend=first), 0)
+        self.assertEqual(ratelimit.check('test', 'ip', '10.0.0.1', 2, 60, backend=second), 0)
+        self.assertGreater(ratelimit.check('test', 'ip', '10.0.0.1', 2, 60, backend=first), 0)
+        self.assertEqual(ratelimit.check('test', 'ip', '10.0.0.2', 2, 60, backend=second), 0)
+
+    def test_sqlite_is_the_default_backend(self):
+        with mock.patch.object(ratelimit, '_backend', None), \
+                override_settings(RATE_LIMIT_SQLITE_PATH=os.path.join(self.directory.name, 'default.sqlite3')):
+            self.assertIsInstance(ratelimit.get_backend(), ratelimit.SQLiteBackend)
+
+    def call_async_view(self, backend):
+        @ratelimit.rate_limit('test')
+        async def view(request):
+            return 'ok'
+
+        backend.cache.clear()
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.3')
+        with mock.patch.object(ratelimit, '_backend', backend):
+            return [async_to_sync(view)(request) for _ in range(3)]
+
+    def test_async_views_check_shared_backends_off_the_event_loop(self):
+        backend = RecordingBackend(process_local=False)
+        results = self.call_async_view(backend)
+        self.assertEqual(results[:2], ['ok', 'ok'])
+        self.assertEqual(results[2].status_code, 429)
+        self.assertEqual(backend.on_event_loop, {False})
+
+        backend = RecordingBackend(process_local=True)
+        self.call_async_view(backend)
+        self.assertEqual(backend.on_event_loop, {True})
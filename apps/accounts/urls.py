@@ -1,6 +1,11 @@
 from django.urls import path
 from . views import *
 from . models import *
+from django.conf import settings
+
+if settings.ASYNC_VIEWS:
+    # async sign-in for ASGI deployments
+    from .async_views import signin  # noqa: F811
 
 urlpatterns = [
     path('signup/', sign_up, name='sign_up'),
@@ -16,6 +21,7 @@ urlpatterns = [
     path('all-user/', all_user, name='all_user'),
     path('inactive-users/', inactive_users, name='inactive_users'),
     path('active-users/', active_users, name='active_users'),
+    path('all-accounts/', all_accounts, name='all_accounts'),
     path('my-accounts/', my_accounts, name='my_accounts')
     # path("send-email/", send_email, name="send_email"),
 ]
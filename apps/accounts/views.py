@@ -4,18 +4,22 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apps.accounts.authentication import CachedJWTAuthentication
 from django.utils import timezone
 from .models import *
 from .utils import *
 from .serializers import *
 from apps.accounts.permissions import IsSuperAdmin, IsActiveUser, IsAdminUser
-from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from .outbox import enqueue_email
+from .stats import dashboard_payload, get_stats, live_stats
+from .listing import OLDEST_ORDERING, user_listing
+from .ratelimit import rate_limit
 
 
 # Create your views here.
 @api_view(['POST'])
+@rate_limit('sign_up')
 def sign_up(request):
     serializer = SignUpSerializer(data=request.data)
     if serializer.is_valid():
@@ -25,9 +29,9 @@ def sign_up(request):
             location=serializer.validated_data.get('location'),
         )
         user.set_password(serializer.validated_data.get('password'))
-        mail = user.email
-        send_mail_verification(mail)
-        user.save()
+        with transaction.atomic():
+            user.save()
+            send_mail_verification(user.email)
         return Response({"message": "User successfully registered."}, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -36,19 +40,11 @@ def send_mail_verification(receiver_email):
     subject = "Welcome to Floating Library"
     message = "Thank you for registering with Floating Library. Your account is under review and will be activated soon."
 
-    from_email = settings.DEFAULT_FROM_EMAIL  
-    recipient_list = receiver_email   
-    mail = EmailMultiAlternatives(
-        subject=subject,
-        body=message,
-        from_email=from_email,
-        to=[recipient_list],
-    )
-    mail.send(fail_silently=False)
-    print("Verification email sent successfully to:", recipient_list)
+    enqueue_email(subject, message, receiver_email)
 
 
 @api_view(['POST'])
+@rate_limit('signin')
 def signin(request):
     serializer = signInSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -98,7 +94,7 @@ def signin(request):
 #edit profile
 @api_view(['PATCH'])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def edit_profile(request):
     user = request.user  
     serializer = UpdateSerializer(user, data=request.data, partial=True)
@@ -113,7 +109,7 @@ def edit_profile(request):
 
 @api_view(['POST'])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def change_password(request):
     serializer = ChangePasswordSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -140,6 +136,7 @@ def change_password(request):
 
 
 @api_view(['POST'])
+@rate_limit('forgot_password')
 def forgot_password(request):
     serializer = RequestResetSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -149,13 +146,14 @@ def forgot_password(request):
     if user:
         otp = generate_otp()
         hashed_otp = hash_otp(otp)
-        Otp.objects.create(
-            user=user,
-            otp_hash = hashed_otp,
-            is_used = False,
-            expired_at = otp_expired()
-        )
-        send_otp_via_email(email, otp)
+        with transaction.atomic():
+            Otp.objects.create(
+                user=user,
+                otp_hash = hashed_otp,
+                is_used = False,
+                expired_at = otp_expired()
+            )
+            send_otp_via_email(email, otp)
         return Response({"message": "OTP send seccessfully."}, status=status.HTTP_200_OK)
     
 
@@ -163,19 +161,12 @@ def send_otp_via_email(receiver_email, otp: str):
     subject = "Your OTP Code"
     message = f"Your OTP code is: {otp}. It will expire in 10 minutes."
 
-    from_email = settings.DEFAULT_FROM_EMAIL  
-    recipient_list = receiver_email   
-    mail = EmailMultiAlternatives(
-        subject=subject,
-        body=message,
-        from_email=from_email,
-        to=[recipient_list],
-    )
-    mail.send(fail_silently=False)
-    print("Email sent successfully to:", recipient_list)
+    # the code is only needed until delivery, don't keep it in the outbox
+    enqueue_email(subject, message, receiver_email, sensitive=True)
 
 
 @api_view(['POST'])
+@rate_limit('verify_otp')
 def verify_otp(request):
     serializer = VerifyOtpSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -222,7 +213,7 @@ def reset_password(request):
 
 @api_view(['PATCH'])
 @permission_classes([IsSuperAdmin])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def make_user_admin(request, user_id):
     user = get_object_or_404(User, id=user_id)
     user.role = 'ADMIN'
@@ -233,13 +224,13 @@ def make_user_admin(request, user_id):
 
 @api_view(['POST'])
 @permission_classes([IsSuperAdmin, IsAdminUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def activate_user_account(request, user_id):
     user = get_object_or_404(User, id=user_id)
     user.is_active = True
-    mail = user.email
-    send_mail_activation(mail)
-    user.save()
+    with transaction.atomic():
+        user.save()
+        send_mail_activation(user.email)
     return Response({"message": "User account activated."}, status=status.HTTP_200_OK)
 
 
@@ -247,87 +238,70 @@ def send_mail_activation(receiver_email):
     subject = "Account Activation Notice"
     message = "Your account has been activated. You can now log in and start using our services."
 
-    from_email = settings.DEFAULT_FROM_EMAIL  
-    recipient_list = receiver_email   
-    mail = EmailMultiAlternatives(
-        subject=subject,
-        body=message,
-        from_email=from_email,
-        to=[recipient_list],
-    )
-    mail.send(fail_silently=False)
+    enqueue_email(subject, message, receiver_email)
 
 
 @api_view(["PATCH"])
 @permission_classes([IsSuperAdmin, IsAdminUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def deactivate_user_account(request, user_id):
     user = get_object_or_404(User, id=user_id)
     user.is_active = False
-    mail = user.email
-    send_mail(mail)
-    user.save()
+    with transaction.atomic():
+        user.save()
+        send_mail(user.email)
     return Response({"message":"This users account has been deactivated."}, status=status.HTTP_200_OK)
 
 def send_mail(receiver_email):
     subject = "Account Deactivation Notice"
     message = "Your account has been deactivated. Please contact support for more information."
 
-    from_email = settings.DEFAULT_FROM_EMAIL  
-    recipient_list = receiver_email   
-    mail = EmailMultiAlternatives(
-        subject=subject,
-        body=message,
-        from_email=from_email,
-        to=[recipient_list],
-    )
-    mail.send(fail_silently=False)
+    enqueue_email(subject, message, receiver_email)
 
 
 # Dashboard stats for counts active users, lenders, and borrowers
 @api_view(["GET"])
 @permission_classes([IsSuperAdmin])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def dashboard_stats(request):
-    return Response({
-        "total_users": User.objects.filter(is_active=True).count(),
-        "total_lenders": User.objects.filter(is_lender=True, is_active=True).count(),
-        "total_borrowers": User.objects.filter(is_borrower=True, is_active=True).count(),
-    }, status=status.HTTP_200_OK)
+    # ?live=true counts from the tables instead of the materialized row
+    if request.GET.get('live', '').lower() in ('1', 'true'):
+        stats = live_stats()
+    else:
+        stats = get_stats()
+    return Response(dashboard_payload(stats), status=status.HTTP_200_OK)
 
 
 
 @api_view(['GET'])
 @permission_classes([IsSuperAdmin])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def all_user(request):
     accounts = User.objects.filter(is_superuser=False).exclude(id=request.user.id)
-    serializer = UserSerializer(accounts, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return user_listing(request, accounts)
 
 
 @api_view(["GET"])
 @permission_classes([IsSuperAdmin])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def active_users(request):
     active_users = User.objects.filter(is_active=True)
-    serializer = UserSerializer(active_users, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return user_listing(request, active_users)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsSuperAdmin])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def inactive_users(request):
     inactive_users = User.objects.filter(is_active=False)
-    serializer = UserSerializer(inactive_users, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    # approval queue: oldest signups first
+    return user_listing(request, inactive_users, ordering=OLDEST_ORDERING)
 
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def my_accounts(request):
     my_accounts = User.objects.filter(user=request.user)
     serializer = UserSerializer(my_accounts)
@@ -336,8 +310,7 @@ def my_accounts(request):
 
 @api_view(['GET'])
 @permission_classes([IsSuperAdmin])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def all_accounts(request):
     accounts = User.objects.filter(is_superuser=False).exclude(id=request.user.id)
-    serializer = UserSerializer(accounts, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+    return user_listing(request, accounts)
\ No newline at end of file
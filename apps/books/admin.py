@@ -9,4 +9,5 @@ admin.site.register(BorrowRequest)
 admin.site.register(BookReview)
 admin.site.register(Comment)
 admin.site.register(Comment_vote)
-admin.site.register(WishList)
\ No newline at end of file
+admin.site.register(WishList)
+admin.site.register(Watermark)
@@ -0,0 +1,90 @@
+"""
+Async versions of the hot read endpoints for ASGI deployments. They return
+the same payloads as their sync twins in views.py; urls.py routes to them
+when ASYNC_VIEWS is on (see docs/asgi.md).
+"""
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.accounts.async_api import async_api_view, render
+from apps.accounts.permissions import IsActiveUser
+
+from .cache import cache_response
+from .comments import aload_comment_children, paginate_roots
+from .conditional import abook_version, book_etag
+from .models import Book, WishList
+from .pagination import RankedPagination, apaginate
+from .search import get_search_backend
+from .serializers import (
+    BookDetailSerializer, BookListSerializer, BorrowHistorySerializer, LendHistorySerializer, WishListSerializer,
+)
+from .views import NEWEST_ORDERING, history_queryset
+
+
+@async_api_view(['GET'])
+async def book_details(request, book_id):
+    # the conditional check costs one aggregate query, a 304 stops there
+    if await abook_version(request, book_id) is None:
+        raise Http404("No Book matches the given query.")
+    etag = quote_etag(book_etag(request, book_id))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    book = await Book.objects.select_related('owner', 'category').filter(pk=book_id).afirst()
+    if book is None:
+        raise Http404("No Book matches the given query.")
+    children = await aload_comment_children(book.pk)
+    page, next_cursor = paginate_roots(children, request)
+    # hand the serializer the preloaded thread so it never queries
+    context = {'request': request, '_comment_pages': {book.pk: (children, page, next_cursor)}}
+    serializer = BookDetailSerializer(book, context=context)
+    response = render(Response({"data": serializer.data}, status=status.HTTP_200_OK))
+    response['ETag'] = etag
+    return response
+
+
+@cache_response(['books'])
+@async_api_view(['GET'])
+async def book_list(request):
+    return await apaginate(request, Book.objects.all(), BookListSerializer, NEWEST_ORDERING)
+
+
+@async_api_view(['GET'])
+async def book_search(request):
+    query = request.GET.get('q', '')
+    if not query:
+        return Response({"message": "Please provide a search query."}, status=status.HTTP_400_BAD_REQUEST)
+    backend = get_search_backend()
+    paginator = RankedPagination(lambda offset, limit: backend.search(query, offset, limit))
+    books = await paginator.apaginate_queryset(Book.objects.all(), request)
+    if not books and paginator.page == 1:
+        return Response({"message": "No books found."}, status=status.HTTP_404_NOT_FOUND)
+    serializer = BookListSerializer(books, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@async_api_view(['GET'], authenticate=True, permission_classes=[IsActiveUser])
+async def wishlist(request):
+    entries = WishList.objects.filter(user=request.user).select_related('user', 'book')
+    serializer = WishListSerializer([entry async for entry in entries], many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# borrower history
+@async_api_view(['GET'], authenticate=True, permission_classes=[IsActiveUser])
+async def borrow_request_page(request):
+    borrow_requests = [row async for row in history_queryset(requester=request.user)]
+    serializer = BorrowHistorySerializer(borrow_requests, many=True)
+    return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+
+
+# lender history
+@async_api_view(['GET'], authenticate=True, permission_classes=[IsActiveUser])
+async def lend_request_page(request):
+    lend_requests = [row async for row in history_queryset(owner=request.user)]
+    serializer = LendHistorySerializer(lend_requests, many=True)
+    return Response({"data": serializer.data}, status=status.HTTP_200_OK)
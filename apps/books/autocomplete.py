@@ -0,0 +1,206 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+
+NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return NON_WORD_RE.sub(' ', text.casefold()).strip()
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over normalized book titles and authors.
+
+    Entries are ``(key, book_id)`` tuples kept in sorted order, so a lookup
+    is one bisect plus a short forward scan. By default every word start of
+    the title and author is indexed ("algorithms" finds "Introduction to
+    Algorithms"). ``compact`` mode indexes only the full title and author,
+    which bounds the index at two entries per book for very large catalogs:
+    it keeps no titles in memory and calls ``loader(ids)`` for the display
+    fields of the few matches a lookup returns.
+    """
+
+    def __init__(self, compact=False, key_length=48, loader=None):
+        if compact and loader is None:
+            raise ValueError("compact mode needs a loader for the display fields")
+        self.compact = compact
+        self.key_length = key_length
+        self.loader = loader
+        self.entries = []
+        # pk -> (title, author), or in compact mode the pk's keys, which
+        # share their strings with ``entries``
+        self.books = {}
+        self.lock = threading.RLock()
+
+    def keys_for(self, title, author):
+        keys = set()
+        for text in (title, author):
+            normalized = normalize(text)
+            if not normalized:
+                continue
+            if self.compact:
+                keys.add(normalized[:self.key_length])
+                continue
+            words = normalized.split(' ')
+            for i in range(len(words)):
+                keys.add(' '.join(words[i:])[:self.key_length])
+        return keys
+
+    def build(self, rows):
+        entries = []
+        books = {}
+        for pk, title, author in rows:
+            keys = self.keys_for(title, author)
+            books[pk] = self._stored(title, author, keys)
+            entries.extend((key, pk) for key in keys)
+        entries.sort()
+        with self.lock:
+            self.entries = entries
+            self.books = books
+
+    def _stored(self, title, author, keys):
+        return tuple(keys) if self.compact else (title, author)
+
+    def add(self, pk, title, author):
+        with self.lock:
+            self.remove(pk)
+            keys = self.keys_for(title, author)
+            self.books[pk] = self._stored(title, author, keys)
+            for key in keys:
+                insort(self.entries, (key, pk))
+
+    def remove(self, pk):
+        with self.lock:
+            current = self.books.pop(pk, None)
+            if current is None:
+                return
+            for key in (current if self.compact else self.keys_for(*current)):
+                i = bisect_left(self.entries, (key, pk))
+                if i < len(self.entries) and self.entries[i] == (key, pk):
+                    del self.entries[i]
+
+    def lookup(self, query, limit=10):
+        prefix = normalize(query)[:self.key_length]
+        if not prefix:
+            return []
+        matches = []
+        # add/remove shift the list in place, so the scan holds the lock; it
+        # stops after ``limit`` matches, the loader query runs outside
+        with self.lock:
+            entries = self.entries
+            i = bisect_left(entries, (prefix,))
+            while i < len(entries) and len(matches) < limit:
+                key, pk = entries[i]
+                if not key.startswith(prefix):
+                    break
+                if pk not in matches and pk in self.books:
+                    matches.append(pk)
+                i += 1
+            if not self.compact:
+                details = {pk: self.books[pk] for pk in matches}
+        if self.compact:
+            details = self.loader(matches)
+        return [
+            {"id": pk, "title": details[pk][0], "author": details[pk][1]}
+            for pk in matches if pk in details
+        ]
+
+    def ids(self):
+        with self.lock:
+            return set(self.books)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def load_titles(ids):
+    from .models import Book
+
+    rows = Book.objects.filter(id__in=ids).values_list('id', 'title', 'author')
+    return {pk: (title, author) for pk, title, author in rows}
+
+
+class AutocompleteIndex:
+    """
+    Per-process index built lazily on first use. Writes handled by this
+    worker are applied straight from Book signals; writes made by other
+    workers are picked up by a cheap ``updated_at`` delta query at most once
+    every ``refresh_seconds``. Deletes leave nothing to query by date, so a
+    refresh also compares the row count with the index and, when they
+    differ, drops the ids that are gone.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def refresh_seconds(self):
+        return getattr(settings, 'BOOK_AUTOCOMPLETE_REFRESH_SECONDS', 30)
+
+    def get(self):
+        if self.index is None:
+            with self.lock:
+                if self.index is None:
+                    self._build()
+        elif time.monotonic() - self.refreshed_at > self.refresh_seconds:
+            self._refresh()
+        return self.index
+
+    def _build(self):
+        from .models import Book
+
+        index = PrefixIndex(
+            compact=getattr(settings, 'BOOK_AUTOCOMPLETE_COMPACT', False),
+            key_length=getattr(settings, 'BOOK_AUTOCOMPLETE_KEY_LENGTH', 48),
+            loader=load_titles,
+        )
+        self.watermark = Book.objects.order_by('-updated_at').values_list('updated_at', flat=True).first()
+        index.build(Book.objects.order_by().values_list('id', 'title', 'author').iterator(chunk_size=2000))
+        self.refreshed_at = time.monotonic()
+        self.index = index
+
+    def _refresh(self):
+        from .models import Book
+
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.refreshed_at = time.monotonic()
+            changed = Book.objects.order_by('updated_at')
+            if self.watermark is not None:
+                changed = changed.filter(updated_at__gt=self.watermark)
+            for pk, title, author, updated_at in changed.values_list('id', 'title', 'author', 'updated_at'):
+                self.index.add(pk, title, author)
+                self.watermark = updated_at
+            if Book.objects.count() != len(self.index.books):
+                for pk in self.index.ids() - set(Book.objects.values_list('id', flat=True)):
+                    self.index.remove(pk)
+        finally:
+            self.lock.release()
+
+    def book_saved(self, book):
+        if self.index is not None:
+            self.index.add(book.pk, book.title, book.author)
+
+    def book_deleted(self, pk):
+        if self.index is not None:
+            self.index.remove(pk)
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,32 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _run(fn, args):
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception("Background task %s%r failed", fn.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def run_after_commit(fn, *args):
+    """
+    Run ``fn(*args)`` on the shared in-process thread pool once the current
+    transaction commits. Used for cover downloads and variant generation.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BOOK_IMAGE_INGEST_THREADS', 4), thread_name_prefix='books-bg'
+        )
+    transaction.on_commit(lambda: _executor.submit(_run, fn, args))
@@ -0,0 +1,239 @@
+"""
+Borrow request state machine: PENDING -> ACCEPTED -> RETURNED, or PENDING
+-> REJECTED/CANCELLED (those rows are deleted).
+
+Every transition is a conditional ``UPDATE/DELETE ... WHERE status=<from>``
+inside one transaction, so of two concurrent calls exactly one wins and the
+other gets a 409. The database backs this up with partial unique
+constraints: one ACCEPTED request per book and one PENDING request per
+requester and book. ``.update()`` skips the model signals and auto_now, so
+the helpers here do their bookkeeping (dashboard counters, cache tags, the
+request's ``updated_at``) themselves. The book's ``updated_at`` stays put:
+availability changes show up through the borrow requests.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import status
+
+from apps.accounts import stats
+from apps.accounts.authentication import invalidate_cached_user
+from apps.accounts.models import User
+from apps.accounts.outbox import enqueue_email
+
+from .cache import invalidate_tags
+from .models import Book, BorrowRequest
+from .notifications import notify_borrow_event
+
+
+class BorrowError(Exception):
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def conflict(message):
+    return BorrowError(message, status.HTTP_409_CONFLICT)
+
+
+def max_active_loans():
+    return getattr(settings, 'BORROW_MAX_ACTIVE_LOANS', 2)
+
+
+def loan_days():
+    return getattr(settings, 'BORROW_LOAN_DAYS', 14)
+
+
+# send email to lender when borrower request is created
+def send_mail_to_lender(recipient_email, borrower_email, book_title):
+    subject = "New Borrow Request"
+    message = f"You have a new borrow request for your book '{book_title}' from {borrower_email}."
+    enqueue_email(subject, message, recipient_email, from_email=borrower_email)
+
+
+def _stats_deltas(model, before, after):
+    deltas = Counter(stats.row_metrics(model, after))
+    deltas.subtract(stats.row_metrics(model, before))
+    return deltas
+
+
+def _load(request_id):
+    borrow_request = (
+        BorrowRequest.objects
+        .select_related('requester', 'owner', 'book__owner', 'book__category')
+        .filter(pk=request_id)
+        .first()
+    )
+    if borrow_request is None:
+        raise BorrowError("No BorrowRequest matches the given query.", status.HTTP_404_NOT_FOUND)
+    return borrow_request
+
+
+def _transition(borrow_request, source, **changes):
+    """
+    Move ``borrow_request`` out of ``source`` with one conditional UPDATE and
+    invalidate what its post_save receivers would. Raises a conflict when
+    another request got there first, returns the dashboard counter deltas.
+    """
+    fields = stats.TRACKED_FIELDS[BorrowRequest]
+    before = {**{field: getattr(borrow_request, field) for field in fields}, 'status': source}
+    changes['updated_at'] = timezone.now()
+    claimed = BorrowRequest.objects.filter(pk=borrow_request.pk, status=source).update(**changes)
+    if not claimed:
+        raise conflict("This request has already been processed.")
+    for field, value in changes.items():
+        setattr(borrow_request, field, value)
+    after = {field: getattr(borrow_request, field) for field in fields}
+    borrow_request._stats_loaded = after
+    invalidate_tags('availability', f'book:{borrow_request.book_id}')
+    return _stats_deltas(BorrowRequest, before, after)
+
+
+def _lock_user(user_id):
+    # the row lock serialises loan changes per user until commit, sqlite
+    # ignores it but only ever runs one writer at a time anyway
+    return User.objects.select_for_update().filter(pk=user_id).values(*stats.TRACKED_FIELDS[User]).get()
+
+
+def _set_user_flags(user_id, before, **changes):
+    """UPDATE a user's role flags if they change, returns the counter deltas."""
+    after = {**before, **changes}
+    if after == before:
+        return Counter()
+    # only count the change if the flags still hold what ``before`` says
+    if not User.objects.filter(pk=user_id, **{field: before[field] for field in changes}).update(**changes):
+        return Counter()
+    invalidate_cached_user(user_id)
+    return _stats_deltas(User, before, after)
+
+
+def request_book(user, book_id):
+    # the requester's loan count rides along with the book lookup
+    loans = (
+        BorrowRequest.objects.filter(requester=user, status='ACCEPTED')
+        .order_by().values('requester').annotate(total=Count('id')).values('total')
+    )
+    book = (
+        Book.objects.select_related('owner', 'category')
+        .annotate(requester_loans=Coalesce(Subquery(loans), Value(0), output_field=IntegerField()))
+        .filter(pk=book_id)
+        .first()
+    )
+    if book is None:
+        raise BorrowError("No Book matches the given query.", status.HTTP_404_NOT_FOUND)
+    if book.owner_id == user.pk:
+        raise BorrowError("You cannot request your own book.")
+    limit = max_active_loans()
+    if book.requester_loans >= limit:
+        raise BorrowError(f"You have reached the maximum number of borrowed books ({limit})")
+    if not book.is_available:
+        raise conflict("This book is currently unavailable.")
+
+    try:
+        with transaction.atomic():
+            # a second pending request for the same book trips borrow_one_pending_per_book
+            borrow_request = BorrowRequest.objects.create(
+                requester=user,
+                owner=book.owner,
+                book=book,
+                status='PENDING'
+            )
+            send_mail_to_lender(book.owner.email, user.email, book.title)
+            notify_borrow_event(borrow_request, 'created')
+    except IntegrityError:
+        raise conflict("You have already requested this book.")
+    return borrow_request
+
+
+def accept(request_id, owner):
+    borrow_request = _load(request_id)
+    if borrow_request.status != 'PENDING':
+        raise conflict("This request has already been processed.")
+    if borrow_request.owner_id != owner.pk:
+        raise BorrowError("You are not authorized to accept this request.", status.HTTP_403_FORBIDDEN)
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            # a second ACCEPTED row for the book violates borrow_one_accepted_per_book
+            deltas = _transition(
+                borrow_request, 'PENDING',
+                status='ACCEPTED', accepted_at=now, return_date=now + timedelta(days=loan_days()),
+            )
+            requester = _lock_user(borrow_request.requester_id)
+            limit = max_active_loans()
+            if BorrowRequest.objects.filter(requester_id=borrow_request.requester_id, status='ACCEPTED').count() > limit:
+                raise conflict(f"The borrower already has the maximum number of borrowed books ({limit}).")
+            Book.objects.filter(pk=borrow_request.book_id).update(is_available=False)
+            deltas.update(_set_user_flags(borrow_request.requester_id, requester, is_borrower=True))
+            lender = borrow_request.owner
+            deltas.update(_set_user_flags(
+                lender.pk, {field: getattr(lender, field) for field in stats.TRACKED_FIELDS[User]}, is_lender=True))
+            # one counter UPDATE for the whole transition
+            stats.adjust(deltas)
+            notify_borrow_event(borrow_request, 'accepted')
+    except IntegrityError:
+        raise conflict("This book has already been accepted for borrowing.")
+    borrow_request.book.is_available = False
+    borrow_request.requester.is_borrower = True
+    borrow_request.owner.is_lender = True
+    return borrow_request
+
+
+def return_loan(request_id, requester):
+    borrow_request = _load(request_id)
+    if borrow_request.requester_id != requester.pk:
+        raise BorrowError("You are not authorized to return this book.", status.HTTP_403_FORBIDDEN)
+    if borrow_request.status != 'ACCEPTED':
+        raise conflict("This book you have not borrowed yet.")
+
+    with transaction.atomic():
+        deltas = _transition(
+            borrow_request, 'ACCEPTED',
+            status='RETURNED', is_late=timezone.now() > borrow_request.return_date,
+        )
+        Book.objects.filter(pk=borrow_request.book_id).update(is_available=True)
+        before = _lock_user(requester.pk)
+        still_active_borrower = BorrowRequest.objects.filter(requester_id=requester.pk, status='ACCEPTED').exists()
+        if not still_active_borrower:
+            deltas.update(_set_user_flags(requester.pk, before, is_borrower=False))
+        stats.adjust(deltas)
+        notify_borrow_event(borrow_request, 'returned')
+    borrow_request.book.is_available = True
+    return borrow_request
+
+
+def _discard(borrow_request, event):
+    """Delete a PENDING request unless it moved on meanwhile."""
+    borrow_request.status = event.upper()
+    with transaction.atomic():
+        notify_borrow_event(borrow_request, event)
+        # queryset delete still runs the delete receivers for the rows it removes
+        deleted, _ = BorrowRequest.objects.filter(pk=borrow_request.pk, status='PENDING').delete()
+        if not deleted:
+            raise conflict("This request has already been processed.")
+    return borrow_request
+
+
+def cancel(request_id, requester):
+    borrow_request = _load(request_id)
+    if borrow_request.requester_id != requester.pk:
+        raise BorrowError("No BorrowRequest matches the given query.", status.HTTP_404_NOT_FOUND)
+    if borrow_request.status != 'PENDING':
+        raise conflict("This request has already been processed.")
+    return _discard(borrow_request, 'cancelled')
+
+
+def reject(request_id, owner):
+    borrow_request = _load(request_id)
+    if borrow_request.status != 'PENDING':
+        raise conflict("This request has already been processed.")
+    if borrow_request.owner_id != owner.pk:
+        raise BorrowError("You are not authorized to reject this request.", status.HTTP_403_FORBIDDEN)
+    return _discard(borrow_request, 'rejected')
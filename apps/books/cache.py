@@ -0,0 +1,135 @@
+import functools
+import hashlib
+import inspect
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'BOOK_RESPONSE_CACHE', 'default')]
+
+
+def is_process_local(cache):
+    """Whether every worker process keeps its own copy of ``cache``."""
+    return isinstance(cache, (LocMemCache, DummyCache))
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def tag_versions(tags):
+    """
+    Current version of every tag. A missing version (never set or evicted)
+    is seeded with a fresh timestamp, so an eviction can never resurrect a
+    response cached under an older version.
+    """
+    cache = get_response_cache()
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [str(versions[key]) for key in keys]
+
+
+def invalidate_tags(*tags):
+    """Bump tag versions once the current transaction commits."""
+    def bump():
+        now = time.time_ns()
+        get_response_cache().set_many({_tag_key(tag): now for tag in tags}, timeout=None)
+    transaction.on_commit(bump)
+
+
+def _cache_key(view, request, versions):
+    # pages embed absolute next links, so the host and scheme they were
+    # built for are part of the key (ALLOWED_HOSTS takes any Host header)
+    fingerprint = '|'.join([
+        request.scheme,
+        request.get_host(),
+        request.path,
+        '&'.join(sorted(request.GET.urlencode().split('&'))),
+        request.META.get('HTTP_ACCEPT', ''),
+        *versions,
+    ])
+    return f'resp:{view.__name__}:{hashlib.md5(fingerprint.encode()).hexdigest()}'
+
+
+def _cache_headers(response, max_age, page_tags):
+    response['Cache-Control'] = f'public, max-age={max_age}'
+    response['Surrogate-Key'] = ' '.join(page_tags)
+    return response
+
+
+def cache_response(tags, timeout=None):
+    """
+    Cache successful anonymous GET responses of a public api_view, keyed by
+    view, scheme, host, full query string and Accept header. ``tags`` is a
+    list or a callable taking the view kwargs; writes purge every page
+    carrying one of the tags through invalidate_tags. Apply it above
+    ``@api_view`` (or ``@async_api_view``, which gets an async wrapper).
+
+    With a process-local BOOK_RESPONSE_CACHE (locmem) the views run
+    uncached: a purge would only reach the worker that made the write.
+    """
+    def settings_for(kwargs):
+        page_tags = tags(**kwargs) if callable(tags) else list(tags)
+        max_age = timeout if timeout is not None else getattr(settings, 'BOOK_RESPONSE_CACHE_TIMEOUT', 300)
+        return page_tags, max_age
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                cache = get_response_cache()
+                if request.method != 'GET' or is_process_local(cache):
+                    return await view(request, *args, **kwargs)
+                page_tags, max_age = settings_for(kwargs)
+                key = _cache_key(view, request, await sync_to_async(tag_versions)(page_tags))
+
+                cached = await cache.aget(key)
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                    response['X-Cache'] = 'HIT'
+                else:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    await cache.aset(key, (response.content, response['Content-Type']), max_age)
+                    response['X-Cache'] = 'MISS'
+                return _cache_headers(response, max_age, page_tags)
+            return awrapped
+
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            cache = get_response_cache()
+            if request.method != 'GET' or is_process_local(cache):
+                return view(request, *args, **kwargs)
+            page_tags, max_age = settings_for(kwargs)
+            key = _cache_key(view, request, tag_versions(page_tags))
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Cache'] = 'HIT'
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if hasattr(response, 'render'):
+                    response.render()
+                cache.set(key, (response.content, response['Content-Type']), max_age)
+                response['X-Cache'] = 'MISS'
+            return _cache_headers(response, max_age, page_tags)
+        return wrapped
+    return decorator
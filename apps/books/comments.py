@@ -0,0 +1,45 @@
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import Comment
+from .pagination import get_page_size
+
+
+def load_comment_children(book_id):
+    """Fetch every comment of a book in one query, grouped by parent id."""
+    children = defaultdict(list)
+    comments = Comment.objects.filter(book_id=book_id).select_related('user').order_by('created_at', 'id')
+    for comment in comments:
+        children[comment.parent_id].append(comment)
+    return children
+
+
+async def aload_comment_children(book_id):
+    children = defaultdict(list)
+    comments = Comment.objects.filter(book_id=book_id).select_related('user').order_by('created_at', 'id')
+    async for comment in comments:
+        children[comment.parent_id].append(comment)
+    return children
+
+
+def max_comment_depth():
+    return getattr(settings, 'BOOK_COMMENT_MAX_DEPTH', 4)
+
+
+def paginate_roots(children, request=None):
+    """
+    Slice the root comments after the ``comments_after`` cursor (a root
+    comment id). Returns the page and the cursor of the next page, if any.
+    """
+    roots = children.get(None, [])
+    if request is None:
+        return roots, None
+
+    page_size = get_page_size(request, 'comments_page_size')
+    after = request.GET.get('comments_after')
+    if after and after.isdigit():
+        roots = [comment for comment in roots if comment.id > int(after)]
+    page = roots[:page_size]
+    next_cursor = page[-1].id if len(roots) > page_size else None
+    return page, next_cursor
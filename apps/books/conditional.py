@@ -0,0 +1,77 @@
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+
+from .models import Book, BookReview, Comment
+
+
+def book_version(request, book_id):
+    """
+    Everything book_details renders that can change, read in one aggregate
+    query without loading or serializing the book. Borrow state shows up
+    through the denormalized ``is_available`` flag. Memoized on the request
+    because the conditional check and the view can both need it.
+
+    There is deliberately no Last-Modified: votes, comment and review
+    deletes, returns and image ingestion don't all move a timestamp, so
+    only the ETag over counts, sums and flags tracks them.
+    """
+    cache = request.__dict__.setdefault('_book_versions', {})
+    if book_id not in cache:
+        cache[book_id] = _version_queryset(book_id).first()
+    return cache[book_id]
+
+
+async def abook_version(request, book_id):
+    """
+    book_version for async views. It fills the same memo, so book_etag
+    afterwards runs without queries.
+    """
+    cache = request.__dict__.setdefault('_book_versions', {})
+    if book_id not in cache:
+        cache[book_id] = await _version_queryset(book_id).afirst()
+    return cache[book_id]
+
+
+def _version_queryset(book_id):
+    # a subquery, joining reviews next to comments would multiply the sums
+    review_count = (
+        BookReview.objects.filter(book=OuterRef('pk')).order_by()
+        .values('book').annotate(total=Count('id')).values('total')
+    )
+    return (
+        Book.objects.filter(pk=book_id)
+        .annotate(
+            comment_count=Count('comments'),
+            comments_updated=Max('comments__updated_at'),
+            comment_upvotes=Sum('comments__upvotes'),
+            comment_downvotes=Sum('comments__downvotes'),
+            review_count=Subquery(review_count),
+        )
+        .values(
+            'updated_at', 'rating', 'is_available', 'owner_id', 'category_id',
+            'book_image', 'image_status', 'cover_variants',
+            'comment_count', 'comments_updated', 'comment_upvotes', 'comment_downvotes', 'review_count',
+        )
+    )
+
+
+def book_etag(request, book_id):
+    version = book_version(request, book_id)
+    if version is None:
+        return None
+    # the rendered page also depends on comment pagination parameters
+    raw = repr((sorted(version.items()), sorted(request.GET.lists())))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _comment_book_id(request, comment_id):
+    cache = request.__dict__.setdefault('_comment_books', {})
+    if comment_id not in cache:
+        cache[comment_id] = Comment.objects.filter(pk=comment_id).values_list('book_id', flat=True).first()
+    return cache[comment_id]
+
+
+def comment_etag(request, comment_id):
+    book_id = _comment_book_id(request, comment_id)
+    return book_etag(request, book_id) if book_id else None
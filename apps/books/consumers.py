@@ -0,0 +1,33 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .notifications import user_group
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Per-user notification socket at ``ws/notifications/``. Authenticated by
+    JWTAuthMiddleware; pushes borrow request events from notify_borrow_event.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or not user.is_active:
+            # mirrors the 401 the REST API gives a bad token or an inactive
+            # user (JWTAuthMiddleware leaves both anonymous), close before accepting
+            await self.close(code=4401)
+            return
+        self.group = user_group(user.pk)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'group', None):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # keepalive for proxies that drop idle connections
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def notify(self, message):
+        await self.send_json(message['payload'])
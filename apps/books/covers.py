@@ -0,0 +1,82 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .background import run_after_commit
+from .models import Book
+
+
+def cover_sizes():
+    return getattr(settings, 'BOOK_COVER_SIZES', {'thumb': 160, 'medium': 480})
+
+
+def variant_name(name, variant, extension):
+    stem, _ = os.path.splitext(name)
+    return f"{stem}.{variant}.{extension}"
+
+
+def generate_variants(root, name, sizes):
+    """
+    Write JPEG and WebP copies of ``root/name`` at every width in ``sizes``
+    next to the original and return ``{variant: relative path}``. Touches
+    only the filesystem, so it can run in a separate process.
+    """
+    variants = {}
+    with Image.open(os.path.join(root, name)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'L'):
+            original = original.convert('RGB')
+        for variant, width in sizes.items():
+            image = original.copy()
+            image.thumbnail((width, width * 3))
+            for extension, fmt, options in (('jpg', 'JPEG', {'quality': 82, 'optimize': True}),
+                                            ('webp', 'WEBP', {'quality': 80, 'method': 4})):
+                path = variant_name(name, variant, extension)
+                image.save(os.path.join(root, path), fmt, **options)
+                variants[variant if extension == 'jpg' else f'{variant}_webp'] = path
+            variants[f'{variant}_width'] = image.width
+    return variants
+
+
+def build_book_variants(book_id):
+    book = Book.objects.filter(pk=book_id).first()
+    if not book or not book.book_image:
+        return None
+    book.cover_variants = generate_variants(default_storage.location, book.book_image.name, cover_sizes())
+    book.save(update_fields=['cover_variants', 'updated_at'])
+    return book.cover_variants
+
+
+def schedule_variants(book_id):
+    run_after_commit(build_book_variants, book_id)
+
+
+def cover_payload(book, request=None):
+    """
+    srcset-style description of a book cover for list and detail responses,
+    built from the stored variant paths without touching the filesystem.
+    """
+    variants = book.cover_variants or {}
+    if not variants:
+        return None
+
+    def url(path):
+        link = default_storage.url(path)
+        return request.build_absolute_uri(link) if request else link
+
+    payload = {}
+    srcset = []
+    webp_srcset = []
+    for variant in cover_sizes():
+        if variant not in variants:
+            continue
+        width = variants.get(f'{variant}_width')
+        payload[variant] = url(variants[variant])
+        payload[f'{variant}_webp'] = url(variants[f'{variant}_webp'])
+        srcset.append(f"{payload[variant]} {width}w")
+        webp_srcset.append(f"{payload[f'{variant}_webp']} {width}w")
+    payload['srcset'] = ', '.join(srcset)
+    payload['webp_srcset'] = ', '.join(webp_srcset)
+    return payload
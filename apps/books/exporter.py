@@ -0,0 +1,72 @@
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .models import Book, BorrowRequest, WishList
+
+
+# dataset -> (queryset factory, projected columns, updated_since filter).
+# updated_since catches inserts and updates only: deleted rows (rejected or
+# cancelled borrow requests, removed wishlist entries, deleted books) simply
+# stop appearing, so consumers reconcile deletes from a full export. A book's
+# updated_at only moves on edits, not on reviews (rating) or loans
+# (is_available): those come with the borrow-requests export or a full one
+EXPORTS = {
+    'books': (
+        lambda: Book.objects.order_by('id'),
+        ('id', 'title', 'author', 'language', 'category__name', 'owner_id', 'slug', 'rating',
+         'is_available', 'published_date', 'created_at', 'updated_at'),
+        lambda since: Q(updated_at__gte=since),
+    ),
+    'borrow-requests': (
+        lambda: BorrowRequest.objects.order_by('id'),
+        ('id', 'book_id', 'requester_id', 'owner_id', 'status', 'created_at', 'accepted_at',
+         'return_date', 'is_late', 'updated_at'),
+        lambda since: Q(updated_at__gte=since),
+    ),
+    'wishlists': (
+        lambda: WishList.objects.order_by('id'),
+        ('id', 'user_id', 'book_id', 'added_at'),
+        lambda since: Q(added_at__gte=since),
+    ),
+}
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def export_rows(dataset, updated_since=None, chunk_size=2000):
+    """Stream ``values()`` rows of a dataset with a server-side iterator."""
+    factory, columns, since_filter = EXPORTS[dataset]
+    queryset = factory()
+    if updated_since is not None:
+        queryset = queryset.filter(since_filter(updated_since))
+    return columns, queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def export_lines(dataset, fmt, updated_since=None, chunk_size=2000):
+    """Yield encoded NDJSON or CSV lines; memory stays flat for any table size."""
+    columns, rows = export_rows(dataset, updated_since, chunk_size)
+    names = [column.replace('__', '_') for column in columns]
+    if fmt == 'ndjson':
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        for row in rows:
+            yield (encoder.encode(dict(zip(names, row))) + '\n').encode()
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value.encode()
+
+    writer.writerow(names)
+    yield flush()
+    for row in rows:
+        writer.writerow(['' if value is None else value.isoformat() if hasattr(value, 'isoformat') else value
+                         for value in row])
+        yield flush()
@@ -0,0 +1,218 @@
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from io import BytesIO
+from urllib.parse import urljoin, urlparse
+
+import requests
+import urllib3
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from requests.adapters import HTTPAdapter
+from requests.utils import select_proxy
+
+from .background import run_after_commit
+from .covers import cover_sizes, generate_variants
+from .models import Book
+
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+# bytes per read1(): one recv at most, so the deadline is checked after each
+READ_SIZE = 16 * 1024
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class PinnedAddressAdapter(HTTPAdapter):
+    """
+    HTTPS to a URL whose host was swapped for the address check_host()
+    approved, see _pin(). The Host header keeps the name, which TLS gets
+    for SNI and the certificate check instead of the IP.
+    """
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        hostname = request.headers.get('Host')
+        if not hostname or not request.url.startswith('https:') or select_proxy(request.url, proxies):
+            return super().get_connection_with_tls_context(request, verify, proxies, cert)
+        host_params, pool_kwargs = self.build_connection_pool_key_attributes(request, verify, cert)
+        hostname = hostname.rsplit(':', 1)[0]
+        pool_kwargs.update(server_hostname=hostname, assert_hostname=hostname)
+        return self.poolmanager.connection_from_host(**host_params, pool_kwargs=pool_kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide pooled HTTP session shared by all ingestion threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = PinnedAddressAdapter(pool_connections=16, pool_maxsize=16, max_retries=1)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = 'FloatingLibrary-ImageIngest/1.0'
+                # the body is read raw, the byte cap counts what is stored
+                session.headers['Accept-Encoding'] = 'identity'
+                _session = session
+    return _session
+
+
+def check_host(url):
+    """
+    Refuse non-http(s) URLs and hosts resolving to private addresses.
+    Returns the checked address to connect to, or None when private hosts
+    are allowed and the name is resolved as usual.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ImageFetchError("Only http(s) image URLs are supported")
+    if _setting('BOOK_IMAGE_ALLOW_PRIVATE_HOSTS', False):
+        return None
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(parsed.hostname, None, type=socket.SOCK_STREAM)]
+    except socket.gaierror as exc:
+        raise ImageFetchError(f"Can't resolve {parsed.hostname}") from exc
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        # ::ffff:127.0.0.1 reaches the IPv4 host
+        ip = getattr(ip, 'ipv4_mapped', None) or ip
+        if not ip.is_global or ip.is_multicast:
+            raise ImageFetchError("Image URL points to a private address")
+    return addresses[0]
+
+
+def _pin(url, address):
+    """
+    ``url`` with its host replaced by ``address``, plus the Host header
+    naming the original host. Connecting to the checked address rather than
+    resolving the name again keeps a rebinding DNS server from swapping in
+    a private one between the check and the request.
+    """
+    parsed = urlparse(url)
+    if address is None or address == parsed.hostname:
+        return url, {}
+    host = f'[{address}]' if ':' in address else address
+    port = f':{parsed.port}' if parsed.port else ''
+    return parsed._replace(netloc=host + port).geturl(), {'Host': parsed.hostname + port}
+
+
+def _open(session, url, deadline):
+    """
+    GET ``url`` following redirects by hand, so every hop's host is checked
+    before it is requested, and requested at the address that was checked.
+    """
+    for _ in range(_setting('BOOK_IMAGE_MAX_REDIRECTS', 3) + 1):
+        pinned_url, headers = _pin(url, check_host(url))
+        # a single recv can't outlast the overall deadline either
+        timeout = (3, max(deadline - time.monotonic(), 0.1))
+        response = session.get(pinned_url, headers=headers, stream=True, timeout=timeout, allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers['Location'])
+    raise ImageFetchError("Too many redirects")
+
+
+def fetch_image(url, session=None):
+    """
+    Stream ``url`` with a byte cap and an overall deadline, then verify the
+    body and its pixel count with Pillow. Returns ``(content, extension)``.
+    """
+    max_bytes = _setting('BOOK_IMAGE_MAX_BYTES', 5 * 1024 * 1024)
+    session = session or get_session()
+    deadline = time.monotonic() + _setting('BOOK_IMAGE_TIMEOUT', 10)
+
+    try:
+        with _open(session, url, deadline) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type and not content_type.startswith('image/'):
+                raise ImageFetchError(f"Not an image: {content_type}")
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise ImageFetchError("Image is too large")
+
+            body = bytearray()
+            # read1 returns what one recv got, so a server trickling bytes
+            # can't hold a read open past the deadline
+            while chunk := response.raw.read1(READ_SIZE):
+                body += chunk
+                if len(body) > max_bytes:
+                    raise ImageFetchError("Image is too large")
+                if time.monotonic() > deadline:
+                    raise ImageFetchError("Image download timed out")
+    except (requests.RequestException, urllib3.exceptions.HTTPError) as exc:
+        raise ImageFetchError(f"Can't download image: {exc}") from exc
+
+    try:
+        with Image.open(BytesIO(body)) as image:
+            image_format = image.format
+            # the header's size, before generate_variants decodes any pixels
+            width, height = image.size
+            if width * height > _setting('BOOK_IMAGE_MAX_PIXELS', 25_000_000):
+                raise ImageFetchError("Image dimensions are too large")
+            image.verify()
+    except Image.DecompressionBombError as exc:
+        raise ImageFetchError("Image dimensions are too large") from exc
+    except (UnidentifiedImageError, OSError, SyntaxError) as exc:
+        raise ImageFetchError("Downloaded file is not a valid image") from exc
+    if image_format not in ALLOWED_FORMATS:
+        raise ImageFetchError(f"Unsupported image format: {image_format}")
+    return bytes(body), ALLOWED_FORMATS[image_format]
+
+
+def ingest_book_image(book_id):
+    """
+    Claim a PENDING book and download its cover. The claim is a conditional
+    UPDATE, so the in-process pool and the worker command never fetch the
+    same book twice. Returns the final image status, or None if not claimed.
+    Any error after the claim marks the book FAILED rather than leaving it
+    FETCHING.
+    """
+    claimed = Book.objects.filter(pk=book_id, image_status='PENDING').update(
+        image_status='FETCHING', updated_at=timezone.now())
+    if not claimed:
+        return None
+    try:
+        book = Book.objects.get(pk=book_id)
+        content, extension = fetch_image(book.image_source_url)
+        book.book_image.save(f"{book.slug or book.pk}.{extension}", ContentFile(content), save=False)
+        book.image_status = 'READY'
+        book.cover_variants = generate_variants(default_storage.location, book.book_image.name, cover_sizes())
+        book.save(update_fields=['book_image', 'image_status', 'cover_variants', 'updated_at'])
+    except ImageFetchError as exc:
+        logger.warning("Image ingestion failed for book %s: %s", book_id, exc)
+    except Exception:
+        logger.exception("Image ingestion crashed for book %s", book_id)
+    else:
+        return 'READY'
+    Book.objects.filter(pk=book_id, image_status='FETCHING').update(image_status='FAILED', updated_at=timezone.now())
+    return 'FAILED'
+
+
+def schedule_ingestion(book_id):
+    """
+    Hand the book to the in-process thread pool once the creating
+    transaction commits. With BOOK_IMAGE_INGEST_IN_PROCESS off the book
+    stays PENDING for the ingest_book_images worker.
+    """
+    if _setting('BOOK_IMAGE_INGEST_IN_PROCESS', True):
+        run_after_commit(ingest_book_image, book_id)
@@ -0,0 +1,183 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils.dateparse import parse_date
+
+from apps.accounts import stats
+
+from .autocomplete import autocomplete_index
+from .cache import invalidate_tags
+from .models import Book, Catregory
+from .search import get_search_backend
+from .slugs import assign_slugs
+
+
+REQUIRED_FIELDS = ('title', 'author', 'language')
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        self.error_count = 0
+        self.started = time.monotonic()
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "failed": self.error_count,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, dict)`` from a CSV or JSONL text stream, lazily."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def text_stream(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def build_book(row, owner):
+    if row is None:
+        raise ValueError("Row is not a JSON object")
+    values = {key: (str(value).strip() if value is not None else '') for key, value in row.items() if key}
+    missing = [field for field in REQUIRED_FIELDS if not values.get(field)]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    published = values.get('published_date') or None
+    if published and parse_date(published) is None:
+        raise ValueError(f"Invalid published_date: {published}")
+    book = Book(
+        owner=owner,
+        title=values['title'][:255],
+        author=values['author'][:255],
+        language=values['language'][:30],
+        short_description=values.get('short_description') or None,
+        published_date=parse_date(published) if published else None,
+    )
+    return book, (values.get('category') or '').lower() or None
+
+
+def resolve_categories(names):
+    """Category name -> object for a whole chunk, creating missing ones in bulk."""
+    if not names:
+        return {}
+    found = {c.name: c for c in Catregory.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in found]
+    if missing:
+        Catregory.objects.bulk_create([Catregory(name=name) for name in missing], ignore_conflicts=True)
+        created = {c.name: c for c in Catregory.objects.filter(name__in=missing)}
+        # bulk_create skips signals; a concurrent creator may be counted twice
+        # until the next recount_dashboard_stats
+        stats.adjust({'categories': len(created)})
+        found.update(created)
+    return found
+
+
+def import_chunk(chunk, owner, report, batch_size):
+    books = []
+    lines = []
+    for line, row in chunk:
+        report.rows += 1
+        try:
+            books.append(build_book(row, owner))
+            lines.append(line)
+        except ValueError as exc:
+            report.error(line, str(exc))
+    if not books:
+        return
+
+    categories = resolve_categories({name for _, name in books if name})
+    objects = []
+    for book, name in books:
+        book.category = categories.get(name) if name else None
+        objects.append(book)
+
+    for attempt in range(2):
+        try:
+            assign_slugs(objects)
+            with transaction.atomic():
+                Book.objects.bulk_create(objects, batch_size=batch_size)
+                stats.adjust({'books': len(objects)})
+                get_search_backend().index_books(objects)
+            break
+        except DatabaseError as exc:
+            for book in objects:
+                book.slug = None
+                book.pk = None
+            # a concurrent writer took one of the slugs, the second pass
+            # reads it back; anything else fails the chunk, not the import
+            if attempt or not isinstance(exc, IntegrityError):
+                for line in lines:
+                    report.error(line, f"Not imported, the chunk failed: {exc}")
+                return
+
+    for book in objects:
+        autocomplete_index.book_saved(book)
+    invalidate_tags('books', *{f'category:{c.pk}' for c in categories.values()})
+    report.created += len(objects)
+
+
+def import_books(stream, fmt, owner, chunk_size=1000, batch_size=500, progress=None):
+    """
+    Stream rows from a CSV/JSONL text stream into Book in chunks of
+    ``chunk_size``: one category lookup, one slug query and ``bulk_create``
+    per chunk, so memory stays flat regardless of file size.
+    """
+    report = ImportReport()
+    rows = read_rows(stream, fmt)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        import_chunk(chunk, owner, report, batch_size)
+        if progress:
+            progress(report)
+    return report
@@ -0,0 +1,79 @@
+import statistics
+from collections import Counter
+import threading
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test running server URLs with keep-alive clients and report throughput and "
+        "latency percentiles. Used to compare gunicorn and uvicorn, see docs/asgi.md."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="Full URLs, requested round-robin.")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=15.0, help="Seconds to run.")
+        parser.add_argument('--warmup', type=float, default=2.0, help="Seconds discarded before measuring.")
+        parser.add_argument('--token', help="JWT access token sent as a Bearer header.")
+        parser.add_argument('--post-json', help="Send this JSON body with POST instead of GET.")
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f"Bearer {options['token']}"} if options['token'] else {}
+        if options['post_json']:
+            headers['Content-Type'] = 'application/json'
+        urls = options['urls']
+        # failures by status code, or exception name when there was no response
+        latencies, errors, lock = [], Counter(), threading.Lock()
+        start = time.monotonic()
+        measure_from = start + options['warmup']
+        stop_at = measure_from + options['duration']
+
+        def client(offset):
+            session = requests.Session()
+            index = offset
+            while True:
+                url = urls[index % len(urls)]
+                index += 1
+                began = time.monotonic()
+                if began >= stop_at:
+                    return
+                try:
+                    if options['post_json']:
+                        response = session.post(url, data=options['post_json'], headers=headers, timeout=30)
+                    else:
+                        response = session.get(url, headers=headers, timeout=30)
+                    # redirects are followed, anything else outside 2xx/3xx is an error
+                    failed = None if response.status_code < 400 else str(response.status_code)
+                except requests.RequestException as exc:
+                    failed = type(exc).__name__
+                took = time.monotonic() - began
+                if began < measure_from:
+                    continue
+                with lock:
+                    if failed:
+                        errors[failed] += 1
+                    else:
+                        latencies.append(took)
+
+        threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        by_status = ' '.join(f"{reason}={count}" for reason, count in sorted(errors.items()))
+        if not latencies:
+            raise CommandError(f"No successful requests ({by_status or 'none sent'})")
+        latencies.sort()
+        cuts = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"requests={len(latencies)} errors={errors.total()} "
+            f"rps={len(latencies) / options['duration']:.1f} "
+            f"p50={cuts[49] * 1000:.1f}ms p95={cuts[94] * 1000:.1f}ms p99={cuts[98] * 1000:.1f}ms"
+        )
+        if errors:
+            self.stdout.write(f"errors by status: {by_status}")
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.books.cache import invalidate_tags
+from apps.books.covers import cover_sizes, generate_variants
+from apps.books.models import Book
+
+
+def _generate(root, pk, name, sizes):
+    try:
+        return pk, generate_variants(root, name, sizes), None
+    except Exception as exc:
+        return pk, None, f"{type(exc).__name__}: {exc}"
+
+
+class Command(BaseCommand):
+    help = "Backfill thumbnail/medium/WebP cover variants for existing book images in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None, help="Worker processes, defaults to CPU count.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help="Regenerate books that already have variants.")
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(book_image='').exclude(book_image__isnull=True)
+        if not options['force']:
+            books = books.filter(cover_variants={})
+        jobs = list(books.order_by('id').values_list('id', 'book_image'))
+
+        root = default_storage.location
+        sizes = cover_sizes()
+        started = time.monotonic()
+        done = failed = 0
+        pending = []
+
+        # children only resize files, all database writes stay in this process
+        with ProcessPoolExecutor(max_workers=options['processes']) as pool:
+            futures = [pool.submit(_generate, root, pk, name, sizes) for pk, name in jobs]
+            for future in as_completed(futures):
+                pk, variants, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Book {pk}: {error}")
+                    continue
+                pending.append(Book(pk=pk, cover_variants=variants, updated_at=timezone.now()))
+                if len(pending) >= options['batch_size']:
+                    done += self._save(pending)
+                    pending = []
+            done += self._save(pending)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Built variants for {done} books ({failed} failed) in {elapsed:.1f}s"))
+
+    def _save(self, books):
+        if books:
+            # bulk_update skips auto_now, updated_at is set on each row above
+            Book.objects.bulk_update(books, ['cover_variants', 'updated_at'])
+            invalidate_tags('books')
+        return len(books)
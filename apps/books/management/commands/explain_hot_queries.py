@@ -0,0 +1,99 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.utils import timezone
+
+from apps.accounts.listing import NEWEST_ORDERING as USER_NEWEST_ORDERING, OLDEST_ORDERING as USER_OLDEST_ORDERING
+from apps.accounts.models import User
+from apps.books.models import Book, BorrowRequest
+from apps.books.pagination import KeysetPagination
+from apps.books.views import NEWEST_ORDERING, RATING_ORDERING, UPDATED_ORDERING
+
+
+# sqlite reports "SCAN <table>" for a table walk and "SEARCH" for an index
+# seek, postgres reports "Seq Scan on". A sqlite "SCAN ... USING INDEX" is
+# only acceptable for LIMITed first pages: a cursor page walking the index
+# from the start gets slower the deeper it is.
+TABLE_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?\w+\s*$|Seq Scan on', re.MULTILINE)
+INDEX_WALK_RE = re.compile(r'\bSCAN (?:TABLE )?\w+ USING (?:COVERING )?INDEX')
+
+
+def is_full_scan(queryset, plan, cursor_page=False):
+    if TABLE_SCAN_RE.search(plan):
+        return True
+    return (cursor_page or queryset.query.high_mark is None) and bool(INDEX_WALK_RE.search(plan))
+
+
+CURSOR_PAGE = "{}: next page"
+
+
+def hot_queries():
+    user_id = book_id = 1
+    now = timezone.now()
+    accepted = BorrowRequest.objects.filter(status='ACCEPTED')
+    return [
+        ("borrow_request: requester ACCEPTED count", accepted.filter(requester_id=user_id).values('id')),
+        ("accept_borrow_request: requester ACCEPTED count", accepted.filter(requester_id=user_id).values('id')),
+        ("sync_availability: book ACCEPTED exists", accepted.filter(book_id=book_id).values('id')[:1]),
+        ("return_book: still active borrower", accepted.filter(requester_id=user_id).values('id')[:1]),
+        ("borrowed_books_count", accepted.filter(requester_id=user_id).values('id')),
+        ("lent_books_count", accepted.filter(owner_id=user_id).values('id')),
+        ("mark_overdue_loans: due since watermark", accepted.filter(
+            is_late=False, return_date__gte=now - timedelta(minutes=1), return_date__lte=now,
+        ).order_by('return_date', 'id').values('id')[:500]),
+    ] + [query for listing in listings() for query in page_queries(*listing)]
+
+
+def listings():
+    user_id = category_id = 1
+    return [
+        ("book_list", Book.objects.all(), NEWEST_ORDERING),
+        ("updated_books", Book.objects.all(), UPDATED_ORDERING),
+        ("top_rated_books", Book.objects.filter(rating__gt=4), RATING_ORDERING),
+        ("user_books", Book.objects.filter(owner_id=user_id), NEWEST_ORDERING),
+        ("books_by_category", Book.objects.filter(category_id=category_id), NEWEST_ORDERING),
+        ("all_user", User.objects.all(), USER_NEWEST_ORDERING),
+        ("active_users", User.objects.filter(is_active=True), USER_NEWEST_ORDERING),
+        ("inactive_users", User.objects.filter(is_active=False), USER_OLDEST_ORDERING),
+    ]
+
+
+def page_queries(name, queryset, ordering, page_size=20):
+    """The first page and a cursor page of a keyset-paginated listing."""
+    queryset = queryset.order_by(*ordering)
+    paginator = KeysetPagination(ordering)
+    # any cursor does, the plan only depends on the column types
+    position = [
+        timezone.now() if isinstance(queryset.model._meta.get_field(name.lstrip('-')), models.DateTimeField) else 1000
+        for name in ordering
+    ]
+    return [
+        (name, queryset[:page_size + 1]),
+        (CURSOR_PAGE.format(name), queryset.filter(paginator._after(position))[:page_size + 1]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot listing and borrow queries and fail if any of them runs a full table scan."
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, queryset in hot_queries():
+            plan = queryset.explain()
+            full_scan = is_full_scan(queryset, plan, cursor_page=name.endswith(CURSOR_PAGE.format('')))
+            if full_scan:
+                failures.append(name)
+            label = self.style.ERROR("FULL SCAN") if full_scan else self.style.SUCCESS("ok")
+            self.stdout.write(f"[{label}] {name}")
+            if options['verbosity'] > 1 or full_scan:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} hot quer{'y' if len(failures) == 1 else 'ies'} fell back to a full scan "
+                f"on {connection.vendor}: {', '.join(failures)}"
+            )
+        self.stdout.write(self.style.SUCCESS("All hot queries use an index."))
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from apps.books.exporter import EXPORT_FORMATS, EXPORTS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream books, borrow requests or wishlists as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--updated-since', help="ISO 8601 datetime, only rows changed since then.")
+        parser.add_argument('--output', default='-', help="File to write, '-' for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['updated_since']:
+            since = parse_datetime(options['updated_since'])
+            if since is None:
+                raise CommandError("--updated-since must be an ISO 8601 datetime")
+
+        out = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for line in export_lines(options['dataset'], options['format'], since, options['chunk_size']):
+                out.write(line)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import User
+from apps.books.importer import detect_format, import_books, text_stream
+
+
+class Command(BaseCommand):
+    help = "Stream books from a CSV or JSONL file (or stdin) into the catalog in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, '-' for stdin.")
+        parser.add_argument('--owner', required=True, help="Email of the user who will own the imported books.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension, then csv.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(email=options['owner']).first()
+        if owner is None:
+            raise CommandError(f"No user with email {options['owner']}")
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        binary = sys.stdin.buffer if path == '-' else open(path, 'rb')
+
+        def progress(report):
+            self.stdout.write(f"{report.rows} rows, {report.created} created, "
+                              f"{report.error_count} failed, {report.rows_per_second:.0f} rows/sec")
+
+        try:
+            report = import_books(
+                text_stream(binary), fmt, owner,
+                chunk_size=options['chunk_size'], batch_size=options['batch_size'], progress=progress,
+            )
+        finally:
+            if binary is not sys.stdin.buffer:
+                binary.close()
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.created} of {report.rows} rows in {report.elapsed:.1f}s "
+            f"({report.rows_per_second:.0f} rows/sec), {report.error_count} failed"
+        ))
@@ -0,0 +1,65 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.books.images import ingest_book_image
+from apps.books.models import Book
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+def _ingest(book_id):
+    # one bad row must not take the whole pool down
+    try:
+        return ingest_book_image(book_id)
+    except Exception:
+        logger.exception("Image ingestion failed for book %s", book_id)
+        return None
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Download pending book covers submitted as image_url."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--retry-failed', action='store_true', help="Queue FAILED books again first.")
+        parser.add_argument('--reset-stuck', action='store_true',
+                            help="Queue books left FETCHING by a crashed process again first.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new pending books.")
+        parser.add_argument('--interval', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        requeue = []
+        if options['retry_failed']:
+            requeue.append('FAILED')
+        if options['reset_stuck']:
+            requeue.append('FETCHING')
+        if requeue:
+            count = Book.objects.filter(image_status__in=requeue).update(
+                image_status='PENDING', updated_at=timezone.now())
+            self.stdout.write(f"Re-queued {count} books")
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            while True:
+                ids = list(
+                    Book.objects.filter(image_status='PENDING').order_by('id')
+                    .values_list('id', flat=True)[:options['batch_size']]
+                )
+                results = list(pool.map(_ingest, ids))
+                if ids:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{results.count('READY')} ready, {results.count('FAILED')} failed"
+                    ))
+                if len(ids) == options['batch_size']:
+                    continue
+                if not options['loop']:
+                    return
+                time.sleep(options['interval'])
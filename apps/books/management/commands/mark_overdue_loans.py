@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.books.overdue import mark_overdue_loans
+
+
+class Command(BaseCommand):
+    help = "Flag loans that passed their return date since the last run and queue reminder emails."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--full', action='store_true',
+                            help="Ignore the watermark and rescan every past-due loan.")
+        parser.add_argument('--loop', action='store_true', help="Keep ticking instead of running once.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between ticks.")
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            marked = mark_overdue_loans(batch_size=options['batch_size'], full=full)
+            full = False
+            if marked or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Flagged {marked} overdue loans"))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
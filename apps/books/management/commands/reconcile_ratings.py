@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.books.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute book ratings from BookReview and correct drift in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted books without fixing them.")
+
+    def handle(self, *args, **options):
+        corrected = reconcile_ratings(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = "Found" if options['dry_run'] else "Corrected"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {corrected} drifted book ratings"))
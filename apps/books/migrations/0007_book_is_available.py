@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+def backfill_availability(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BorrowRequest = apps.get_model('books', 'BorrowRequest')
+    lent = BorrowRequest.objects.filter(status='ACCEPTED').values('book_id')
+    Book.objects.filter(id__in=lent).update(is_available=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_borrow_and_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='is_available',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(backfill_availability, migrations.RunPython.noop),
+    ]
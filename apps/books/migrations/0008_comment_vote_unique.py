@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:29
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max, Q
+
+
+def dedupe_votes(apps, schema_editor):
+    # the constraint was silently dropped before, keep each user's latest
+    # vote per comment and recount the affected comments
+    Comment = apps.get_model('books', 'Comment')
+    Comment_vote = apps.get_model('books', 'Comment_vote')
+    duplicates = (
+        Comment_vote.objects.values('user_id', 'comment_id')
+        .annotate(total=Count('id'), keep=Max('id'))
+        .filter(total__gt=1)
+    )
+    comment_ids = set()
+    for row in duplicates:
+        Comment_vote.objects.filter(user_id=row['user_id'], comment_id=row['comment_id']).exclude(id=row['keep']).delete()
+        comment_ids.add(row['comment_id'])
+    for comment in Comment.objects.filter(id__in=comment_ids).annotate(
+        up=Count('comment_votes', filter=Q(comment_votes__vote='upvote')),
+        down=Count('comment_votes', filter=Q(comment_votes__vote='downvote')),
+    ):
+        Comment.objects.filter(id=comment.id).update(upvotes=comment.up, downvotes=comment.down)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_is_available'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_votes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='comment_vote',
+            unique_together={('user', 'comment')},
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:30
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def dedupe_reviews(apps, schema_editor):
+    # concurrent toggles could insert the same review twice, keep the latest
+    # one; ratings are corrected afterwards by reconcile_ratings
+    BookReview = apps.get_model('books', 'BookReview')
+    duplicates = (
+        BookReview.objects.values('reviewer_id', 'book_id')
+        .annotate(total=Count('id'), keep=Max('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        BookReview.objects.filter(reviewer_id=row['reviewer_id'], book_id=row['book_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_comment_vote_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_reviews, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='bookreview',
+            unique_together={('reviewer', 'book')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_bookreview_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='image_source_url',
+            field=models.URLField(blank=True, max_length=2000, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='image_status',
+            field=models.CharField(choices=[('NONE', 'None'), ('PENDING', 'Pending'), ('FETCHING', 'Fetching'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='NONE', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('image_status', 'PENDING')), fields=['id'], name='book_image_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:38
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def dedupe_borrow_requests(apps, schema_editor):
+    # racing accepts could lend a book twice: keep the latest loan and close
+    # the others as returned. Duplicate pending requests keep the oldest one.
+    BorrowRequest = apps.get_model('books', 'BorrowRequest')
+    lent_twice = (
+        BorrowRequest.objects.filter(status='ACCEPTED').values('book_id')
+        .annotate(total=Count('id'), keep=Max('id'))
+        .filter(total__gt=1)
+    )
+    for row in lent_twice:
+        BorrowRequest.objects.filter(book_id=row['book_id'], status='ACCEPTED').exclude(id=row['keep']).update(
+            status='RETURNED')
+    requested_twice = (
+        BorrowRequest.objects.filter(status='PENDING').values('requester_id', 'book_id')
+        .annotate(total=Count('id'), keep=Min('id'))
+        .filter(total__gt=1)
+    )
+    for row in requested_twice:
+        BorrowRequest.objects.filter(
+            requester_id=row['requester_id'], book_id=row['book_id'], status='PENDING',
+        ).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_book_cover_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_borrow_requests, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='borrowrequest',
+            name='borrow_book_accepted_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='borrowrequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'ACCEPTED')), fields=('book',), name='borrow_one_accepted_per_book'),
+        ),
+        migrations.AddConstraint(
+            model_name='borrowrequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'PENDING')), fields=('requester', 'book'), name='borrow_one_pending_per_book'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def reset_dashboard_stats(apps, schema_editor):
+    # overdue_loans now counts flagged loans instead of comparing return_date
+    # to the clock, drop the row so the next read recounts it
+    apps.get_model('accounts', 'DashboardStats').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_dashboard_stats'),
+        ('books', '0012_borrow_state_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='borrowrequest',
+            index=models.Index(fields=['status', 'return_date'], name='borrow_status_due_idx'),
+        ),
+        migrations.RunPython(reset_dashboard_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_updated_at(apps, schema_editor):
+    # the latest timestamp the row already carries, so an updated_since
+    # export right after the upgrade doesn't return every request
+    BorrowRequest = apps.get_model('books', 'BorrowRequest')
+    BorrowRequest.objects.update(updated_at=Coalesce('accepted_at', 'created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_overdue_scan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowrequest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='borrowrequest',
+            index=models.Index(fields=['updated_at', 'id'], name='borrow_updated_idx'),
+        ),
+    ]
@@ -1,6 +1,6 @@
-from django.db import models
-from django.utils.text import slugify
+from django.db import IntegrityError, models, transaction
 from apps.accounts.models import User
+from .slugs import base_slug, next_free_slug
 
 
 # Create your models here.
@@ -11,40 +11,77 @@ class Catregory(models.Model):
         return self.name
  
 
+class BookQuerySet(models.QuerySet):
+    def with_live_availability(self):
+        # fallback when the denormalized flag can't be trusted, one EXISTS
+        # per row inside the same query instead of a query per row
+        accepted = BorrowRequest.objects.filter(book=models.OuterRef('pk'), status='ACCEPTED')
+        return self.annotate(live_is_available=~models.Exists(accepted))
+
+    def sync_availability(self):
+        # recompute the denormalized flag from the ACCEPTED loans, one EXISTS
+        # per row inside the UPDATE
+        accepted = BorrowRequest.objects.filter(book=models.OuterRef('pk'), status='ACCEPTED')
+        return self.update(is_available=~models.Exists(accepted))
+
+
 class Book(models.Model):
+    IMAGE_STATUS_CHOICES = (
+        ("NONE", "None"),
+        ("PENDING", "Pending"),
+        ("FETCHING", "Fetching"),
+        ("READY", "Ready"),
+        ("FAILED", "Failed"),
+    )
     title = models.CharField(max_length=255)
     category = models.ForeignKey(Catregory, on_delete=models.CASCADE, blank=True, null=True, related_name='books_category')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='books_owner')
     author = models.CharField(max_length=255)
     book_image = models.ImageField(upload_to="book_images/", blank=True, null=True)
+    # remote cover submitted as image_url, downloaded by apps/books/images.py
+    image_source_url = models.URLField(max_length=2000, blank=True, null=True)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default="NONE")
+    # resized copies of book_image, variant name -> storage path (apps/books/covers.py)
+    cover_variants = models.JSONField(default=dict, blank=True)
     language = models.CharField(max_length=30)
     short_description = models.TextField(null=True, blank=True)
     published_date = models.DateField(null=True, blank=True)
     slug = models.SlugField(max_length=300, unique=True, blank=True, null=True)
     rating = models.IntegerField(default=0)
+    # denormalized "no ACCEPTED borrow request", maintained by the borrow views
+    is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='book_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='book_updated_idx'),
+            models.Index(fields=['rating', 'id'], name='book_rating_idx'),
+            models.Index(fields=['owner', 'created_at', 'id'], name='book_owner_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='book_category_created_idx'),
+            models.Index(fields=['id'], condition=models.Q(image_status='PENDING'), name='book_image_pending_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if self.title and not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-
-            while Book.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-
-            self.slug = slug
-        super().save(*args, **kwargs)
-
-    @property
-    def is_available(self):
-        return not self.borrow_requests.filter(status='ACCEPTED').exists()
+        if not (self.title and not self.slug):
+            return super().save(*args, **kwargs)
+
+        base = base_slug(self.title)
+        for attempt in range(3):
+            self.slug = next_free_slug(Book.objects.all(), base)
+            try:
+                # savepoint so a slug collision with a concurrent create
+                # doesn't break the caller's transaction
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                self.slug = None
+                if attempt == 2 or not Book.objects.filter(slug__startswith=base).exists():
+                    raise
 
 
     def __str__(self):
@@ -66,7 +103,26 @@ class BorrowRequest(models.Model):
     accepted_at = models.DateTimeField(null=True, blank=True)
     return_date = models.DateTimeField(null=True, blank=True)
     is_late = models.BooleanField(default=False)
-    
+    # auto_now only covers save(), the state machine's UPDATEs set it too
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['requester', 'status'], name='borrow_requester_status_idx'),
+            models.Index(fields=['owner', 'status'], name='borrow_owner_status_idx'),
+            models.Index(fields=['book', 'status'], name='borrow_book_status_idx'),
+            # overdue scans: ACCEPTED loans due within a time range
+            models.Index(fields=['status', 'return_date'], name='borrow_status_due_idx'),
+            models.Index(fields=['updated_at', 'id'], name='borrow_updated_idx'),
+        ]
+        constraints = [
+            # at most one open loan per book, its unique index also serves
+            # the "book already lent" lookups
+            models.UniqueConstraint(
+                fields=['book'], condition=models.Q(status='ACCEPTED'), name='borrow_one_accepted_per_book'),
+            models.UniqueConstraint(
+                fields=['requester', 'book'], condition=models.Q(status='PENDING'), name='borrow_one_pending_per_book'),
+        ]
 
     def __str__(self):
         return f"{self.requester.name} → {self.owner.name} ({self.status})"
@@ -78,8 +134,8 @@ class BookReview(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    # class Meta:
-    #     unique_together = ('reviewer', 'book') 
+    class Meta:
+        unique_together = ('reviewer', 'book')
 
 
 class Comment(models.Model):
@@ -107,8 +163,6 @@ class Comment_vote(models.Model):
 
     class Meta:
         unique_together = ('user', 'comment')
-
-    class Meta:
         ordering = ['-created_at']
 
 
@@ -121,4 +175,11 @@ class WishList(models.Model):
         unique_together = ('user', 'book')
 
 
+class Watermark(models.Model):
+    """How far an incremental job (e.g. mark_overdue_loans) has processed."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    def __str__(self):
+        return f"{self.name}: {self.value}"
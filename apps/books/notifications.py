@@ -0,0 +1,56 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+BORROW_EVENTS = ('created', 'accepted', 'rejected', 'cancelled', 'returned')
+
+
+def user_group(user_id):
+    return f'user.{user_id}'
+
+
+def borrow_event_payload(borrow_request, event):
+    return {
+        "event": f"borrow_request.{event}",
+        "request": {
+            "id": borrow_request.id,
+            "status": borrow_request.status,
+            "book": {"id": borrow_request.book_id, "title": borrow_request.book.title},
+            "requester_id": borrow_request.requester_id,
+            "owner_id": borrow_request.owner_id,
+            "created_at": borrow_request.created_at.isoformat() if borrow_request.created_at else None,
+            "accepted_at": borrow_request.accepted_at.isoformat() if borrow_request.accepted_at else None,
+            "return_date": borrow_request.return_date.isoformat() if borrow_request.return_date else None,
+            "is_late": borrow_request.is_late,
+        },
+    }
+
+
+def _send(user_ids, payload):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    for user_id in user_ids:
+        try:
+            async_to_sync(layer.group_send)(user_group(user_id), {"type": "notify", "payload": payload})
+        except Exception:
+            # a push is best effort, the history endpoints stay the source of truth
+            logger.exception("Could not push %s to user %s", payload["event"], user_id)
+
+
+def notify_borrow_event(borrow_request, event):
+    """
+    Push a borrow request event to the requester's and the owner's sockets
+    once the current transaction commits, so clients never see a change
+    that rolled back. The payload is built now, while the row still exists.
+    """
+    if event not in BORROW_EVENTS:
+        raise ValueError(f"Unknown borrow event: {event}")
+    payload = borrow_event_payload(borrow_request, event)
+    user_ids = {borrow_request.requester_id, borrow_request.owner_id}
+    transaction.on_commit(lambda: _send(user_ids, payload))
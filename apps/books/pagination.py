@@ -0,0 +1,182 @@
+import base64
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_page_size(request, param='page_size'):
+    default = getattr(settings, 'BOOK_PAGE_SIZE', 20)
+    maximum = getattr(settings, 'BOOK_MAX_PAGE_SIZE', 100)
+    try:
+        page_size = int(request.GET.get(param, default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on the ordering columns.
+
+    The cursor holds the ordering values of the last row of the page, so the
+    next page is a plain range filter on an index instead of an OFFSET scan.
+    The last ordering column must be unique (``id``) to break ties, and every
+    ordering column must be non-nullable.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=('-created_at', '-id')):
+        self.ordering = tuple(ordering)
+        self.request = None
+        self.next_position = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_size = self._page_queryset(queryset, request)
+        return self._page(list(queryset[:page_size + 1]), page_size)
+
+    async def apaginate_queryset(self, queryset, request):
+        queryset, page_size = self._page_queryset(queryset, request)
+        return self._page([obj async for obj in queryset[:page_size + 1]], page_size)
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        page_size = get_page_size(request, self.page_size_query_param)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+        return queryset, page_size
+
+    def _page(self, rows, page_size):
+        page = rows[:page_size]
+        self.next_position = self._position(page[-1]) if len(rows) > page_size else None
+        return page
+
+    def get_paginated_data(self, data):
+        return {"data": data, "next": self.get_next_link()}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data), status=status.HTTP_200_OK)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        values = [v.isoformat() if isinstance(v, (datetime.date, datetime.datetime)) else v for v in position]
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _position(self, obj):
+        return [getattr(obj, name.lstrip('-')) for name in self.ordering]
+
+    def _after(self, position):
+        # (a, b, id) > (x, y, z) expanded into OR-ed prefix equalities. The
+        # planner can't seek on an OR, so AND on the redundant a >= x bound
+        # that starts the range scan on the composite index at the cursor
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': position[index]})
+            for prev_name, prev_value in zip(self.ordering[:index], position[:index]):
+                step &= Q(**{prev_name.lstrip('-'): prev_value})
+            condition |= step
+        first = self.ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+        return bound & condition
+
+
+class RankedPagination(BasePagination):
+    """
+    Page-number pagination over an ordered id source such as a search
+    backend, where results have no stable column to key a cursor on.
+    """
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, fetch_ids):
+        self.fetch_ids = fetch_ids
+        self.request = None
+        self.page = 1
+        self.has_next = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self._start(request)
+        ids = self._ids(self.fetch_ids((self.page - 1) * page_size, page_size + 1), page_size)
+        books = queryset.in_bulk(ids)
+        return [books[pk] for pk in ids if pk in books]
+
+    async def apaginate_queryset(self, queryset, request):
+        page_size = self._start(request)
+        # the id source may run raw SQL, which has no async API
+        ids = await sync_to_async(self.fetch_ids)((self.page - 1) * page_size, page_size + 1)
+        ids = self._ids(ids, page_size)
+        books = await queryset.ain_bulk(ids)
+        return [books[pk] for pk in ids if pk in books]
+
+    def _start(self, request):
+        self.request = request
+        try:
+            self.page = max(1, int(request.GET.get(self.page_query_param, 1)))
+        except (TypeError, ValueError):
+            raise NotFound('Invalid page')
+        return get_page_size(request, self.page_size_query_param)
+
+    def _ids(self, ids, page_size):
+        self.has_next = len(ids) > page_size
+        return ids[:page_size]
+
+    def get_paginated_data(self, data):
+        return {"data": data, "next": self.get_next_link()}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data), status=status.HTTP_200_OK)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page + 1)
+
+
+def paginate(request, queryset, serializer_class, ordering, context=None):
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, context=context or {})
+    return paginator.get_paginated_response(serializer.data)
+
+
+async def apaginate(request, queryset, serializer_class, ordering, context=None):
+    paginator = KeysetPagination(ordering)
+    page = await paginator.apaginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, context=context or {})
+    return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,64 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Value, When
+
+from .cache import invalidate_tags
+from .models import Book, BookReview
+
+
+def toggle_review(user, book_id):
+    """
+    Add or remove ``user``'s review of a book and move the rating with it in
+    the same transaction. The rating is changed with an F() UPDATE, so
+    concurrent reviews can't lose increments and ``updated_at`` is left
+    alone. Returns ``(created, rating)``, or ``None`` if the book is gone.
+    """
+    for attempt in range(2):
+        try:
+            # IMMEDIATE on sqlite (see DATABASES): racing toggles wait for the
+            # write lock instead of failing the delete's read-to-write upgrade
+            with transaction.atomic():
+                deleted, _ = BookReview.objects.filter(book_id=book_id, reviewer=user).delete()
+                created = not deleted
+                if created:
+                    BookReview.objects.create(book_id=book_id, reviewer=user)
+                if not Book.objects.filter(pk=book_id).update(rating=F('rating') + (1 if created else -1)):
+                    transaction.set_rollback(True)
+                    return None
+            break
+        except IntegrityError:
+            # lost the insert race against our own concurrent request
+            if attempt:
+                raise
+    rating = Book.objects.filter(pk=book_id).values_list('rating', flat=True).first()
+    return created, rating
+
+
+def reconcile_ratings(batch_size=1000, dry_run=False):
+    """
+    Recompute every rating from one GROUP BY over BookReview and correct
+    drifted books with one CASE UPDATE per batch. Returns the number of
+    corrected books.
+    """
+    counts = dict(
+        BookReview.objects.order_by().values('book_id').annotate(total=Count('id')).values_list('book_id', 'total')
+    )
+    corrected = 0
+    drifted = {}
+    for pk, rating in Book.objects.order_by().values_list('id', 'rating').iterator(chunk_size=batch_size):
+        expected = counts.get(pk, 0)
+        if rating != expected:
+            drifted[pk] = expected
+        if len(drifted) >= batch_size:
+            corrected += _apply(drifted, dry_run)
+            drifted = {}
+    corrected += _apply(drifted, dry_run)
+    if corrected and not dry_run:
+        invalidate_tags('ratings')
+    return corrected
+
+
+def _apply(drifted, dry_run):
+    if drifted and not dry_run:
+        whens = [When(pk=pk, then=Value(rating)) for pk, rating in drifted.items()]
+        Book.objects.filter(pk__in=drifted).update(rating=Case(*whens, default=F('rating')))
+    return len(drifted)
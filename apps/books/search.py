@@ -0,0 +1,146 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+
+FTS_TABLE = 'books_book_fts'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def book_document(book):
+    category = book.category.name if book.category_id else ''
+    return (book.id, book.title or '', book.author or '', category, book.short_description or '')
+
+
+class BaseSearchBackend:
+    """Interface every search engine behind book_search has to implement."""
+
+    def index_books(self, books):
+        raise NotImplementedError
+
+    def remove_books(self, book_ids):
+        raise NotImplementedError
+
+    def search(self, query, offset=0, limit=20):
+        """Return book ids for ``query`` in relevance order."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000):
+        """Re-index the whole catalog, returns the number of indexed books."""
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    SQLite FTS5 index over title, author, category name and description.
+    The virtual table is created by migration 0005 and keyed by book id.
+    """
+    # bm25 column weights: title, author, category, short_description
+    weights = (10.0, 5.0, 2.0, 1.0)
+
+    def index_books(self, books):
+        rows = [book_document(book) for book in books]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, author, category, short_description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove_books(self, book_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in book_ids])
+
+    def search(self, query, offset=0, limit=20):
+        match = self.build_match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(w) for w in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s OFFSET %s",
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=1000):
+        from .models import Book
+
+        rows = (
+            Book.objects.order_by()
+            .values_list('id', 'title', 'author', 'category__name', 'short_description')
+            .iterator(chunk_size=batch_size)
+        )
+        count = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            batch = []
+            for pk, title, author, category, description in rows:
+                batch.append((pk, title or '', author or '', category or '', description or ''))
+                if len(batch) >= batch_size:
+                    count += self._insert(cursor, batch)
+                    batch = []
+            count += self._insert(cursor, batch)
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        return count
+
+    def _insert(self, cursor, batch):
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, author, category, short_description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                batch,
+            )
+        return len(batch)
+
+    @staticmethod
+    def build_match(query):
+        # every word becomes a quoted prefix term, so user input can never
+        # be parsed as FTS5 syntax
+        terms = TOKEN_RE.findall(query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Index-less fallback for databases without a full-text engine configured."""
+
+    def index_books(self, books):
+        pass
+
+    def remove_books(self, book_ids):
+        pass
+
+    def search(self, query, offset=0, limit=20):
+        from .models import Book
+
+        books = Book.objects.filter(
+            Q(title__icontains=query) |
+            Q(author__icontains=query) |
+            Q(category__name__icontains=query) |
+            Q(short_description__icontains=query)
+        ).order_by('-created_at', '-id')
+        return list(books.values_list('id', flat=True)[offset:offset + limit])
+
+    def rebuild(self, batch_size=1000):
+        return 0
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        default = (
+            'apps.books.search.SQLiteFTS5Backend' if connection.vendor == 'sqlite'
+            else 'apps.books.search.DatabaseSearchBackend'
+        )
+        _backend = import_string(getattr(settings, 'BOOK_SEARCH_BACKEND', default))()
+    return _backend
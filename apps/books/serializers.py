@@ -2,6 +2,12 @@ from rest_framework import serializers
 from .models import *
 from apps.accounts.models import User
 from apps.accounts.serializers import UserSerializer
+from django.urls import reverse
+from rest_framework.utils.urls import replace_query_param
+from .comments import load_comment_children, max_comment_depth, paginate_roots
+from .images import schedule_ingestion
+from .covers import cover_payload, schedule_variants
+from urllib.parse import urlparse
 
 
 # class UserSerializer(serializers.ModelSerializer):
@@ -19,21 +25,41 @@ class CategorySerializer(serializers.ModelSerializer):
 class CommentSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     replies = serializers.SerializerMethodField()
+    more_replies = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
         fields = [
             "id", "user", "content", "parent",
-            "replies", "created_at", "upvotes", 
+            "replies", "more_replies", "created_at", "upvotes", 
             "downvotes"
             ]
 
+    # with a preloaded ``comment_children`` map in the context the tree is
+    # rendered from memory down to BOOK_COMMENT_MAX_DEPTH, otherwise the
+    # replies are queried per comment
     def get_replies(self, obj):
-        qs = obj.replies.all()
-        return CommentSerializer(qs, many=True).data
-
-import requests
-from django.core.files.base import ContentFile
+        children = self.context.get('comment_children')
+        if children is None:
+            qs = obj.replies.select_related('user')
+            return CommentSerializer(qs, many=True).data
+
+        depth = self.context.get('comment_depth', 0) + 1
+        if depth >= max_comment_depth():
+            return []
+        context = {**self.context, 'comment_depth': depth}
+        return CommentSerializer(children.get(obj.id, []), many=True, context=context).data
+
+    def get_more_replies(self, obj):
+        # "load more replies" link for threads cut off at the max depth
+        children = self.context.get('comment_children')
+        if children is None or not children.get(obj.id):
+            return None
+        if self.context.get('comment_depth', 0) + 1 < max_comment_depth():
+            return None
+        path = reverse('comment_replies', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request else path
 
 class BookCreateUpdateSerializer(serializers.ModelSerializer):
     category = serializers.CharField(write_only=True, required=False)
@@ -53,31 +79,28 @@ class BookCreateUpdateSerializer(serializers.ModelSerializer):
         category = validated_data.pop("category", None)
         image_url = validated_data.pop("image_url", None)
         owner = self.context['request'].user
+        if image_url and not validated_data.get("book_image"):
+            # created right away, the cover is downloaded in the background
+            # (see apps/books/images.py)
+            validated_data.update(image_source_url=image_url, image_status='PENDING')
         book = Book.objects.create(owner=owner, **validated_data)
-        file_image = validated_data.get("book_image", None)
 
         if category:
             category_obj, _ = Catregory.objects.get_or_create(name=category.strip().lower())
             book.category = category_obj
             book.save()
-            
-        if file_image:
-            pass
-
-        if image_url:
-            try:
-                response = requests.get(image_url)
-                if response.status_code == 200:
-                    filename = image_url.split("/")[-1]
-                    book.book_image.save(filename, ContentFile(response.content), save=True)
-                else:
-                    raise serializers.ValidationError({"image_url": "Invalid image URL"})
-            except Exception as e:
-                raise serializers.ValidationError({"image_url": "Can't upload the URL"})
-
-        book.save()
+
+        if book.image_status == 'PENDING':
+            schedule_ingestion(book.id)
+        elif book.book_image:
+            schedule_variants(book.id)
         return book
 
+    def validate_image_url(self, value):
+        if urlparse(value).scheme not in ('http', 'https'):
+            raise serializers.ValidationError("Only http(s) image URLs are supported.")
+        return value
+
     def update(self, instance, validated_data):
         category = validated_data.pop('category', None)
         instance.title = validated_data.get('title', instance.title)
@@ -90,33 +113,69 @@ class BookCreateUpdateSerializer(serializers.ModelSerializer):
         if category:
             category_obj, _ = Catregory.objects.get_or_create(name=category.strip().lower())
             instance.category = category_obj
+        if 'book_image' in validated_data:
+            instance.cover_variants = {}
         instance.save()
+        if 'book_image' in validated_data and instance.book_image:
+            schedule_variants(instance.id)
         return instance
 
 
 class BookDetailSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
     is_available = serializers.SerializerMethodField()
+    cover = serializers.SerializerMethodField()
     class Meta:
         model = Book
         fields = [
             'id', 'title', 'author', 'published_date',
-            'book_image', 'language', 'created_at', 'updated_at',
-            'slug', 'category', 'owner', 'comments', 'short_description', 'is_available', 'rating'
+            'book_image', 'cover', 'image_status', 'language', 'created_at', 'updated_at',
+            'slug', 'category', 'owner', 'comments', 'comments_next', 'short_description', 'is_available', 'rating'
         ]
 
+    def _comment_page(self, obj):
+        # one query for the whole thread, shared by comments and comments_next
+        cache = self.context.setdefault('_comment_pages', {})
+        if obj.pk not in cache:
+            children = load_comment_children(obj.pk)
+            page, next_cursor = paginate_roots(children, self.context.get('request'))
+            cache[obj.pk] = (children, page, next_cursor)
+        return cache[obj.pk]
+
+    def get_comments(self, obj):
+        children, page, _ = self._comment_page(obj)
+        context = {'request': self.context.get('request'), 'comment_children': children}
+        return CommentSerializer(page, many=True, context=context).data
+
+    def get_comments_next(self, obj):
+        request = self.context.get('request')
+        _, _, next_cursor = self._comment_page(obj)
+        if next_cursor is None or request is None:
+            return None
+        return replace_query_param(request.build_absolute_uri(), 'comments_after', next_cursor)
+
+    def get_cover(self, obj):
+        return cover_payload(obj, self.context.get('request'))
+
     def get_is_available(self, obj):
-        return obj.is_available
+        # prefer the live annotation when the queryset carries one
+        return getattr(obj, 'live_is_available', obj.is_available)
     
     
 
 
 class BookListSerializer(serializers.ModelSerializer):
+    cover = serializers.SerializerMethodField()
+
     class Meta:
         model = Book
-        fields = ["id", "title", "author",  "book_image"]
+        fields = ["id", "title", "author",  "book_image", "cover"]
+
+    def get_cover(self, obj):
+        return cover_payload(obj, self.context.get('request'))
 
 
 class BorrowRequestSerializer(serializers.ModelSerializer):
@@ -129,6 +188,33 @@ class BorrowRequestSerializer(serializers.ModelSerializer):
         fields = ['id', 'requester', 'owner', 'book', 'status', 'created_at']
 
 
+class HistoryBookSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'book_image']
+
+
+class HistoryUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'name']
+
+
+# compact rows for the borrow/lend history pages, built from one
+# select_related query (see history_queryset in views)
+class BorrowHistorySerializer(serializers.ModelSerializer):
+    book = HistoryBookSerializer(read_only=True)
+    counterpart = HistoryUserSerializer(source='owner', read_only=True)
+
+    class Meta:
+        model = BorrowRequest
+        fields = ['id', 'book', 'counterpart', 'status', 'created_at', 'accepted_at', 'return_date', 'is_late']
+
+
+class LendHistorySerializer(BorrowHistorySerializer):
+    counterpart = HistoryUserSerializer(source='requester', read_only=True)
+
+
 class WishListSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     book = BookListSerializer(read_only=True)
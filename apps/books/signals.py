@@ -0,0 +1,66 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_tags
+from .models import Book, BookReview, BorrowRequest, Catregory
+from .autocomplete import autocomplete_index
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_books([instance])
+    autocomplete_index.book_saved(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    get_search_backend().remove_books([instance.pk])
+    autocomplete_index.book_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Catregory)
+def reindex_category_books(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    get_search_backend().index_books(instance.books_category.select_related('category'))
+
+
+@receiver(post_delete, sender=BorrowRequest)
+def release_book(sender, instance, **kwargs):
+    # an active loan removed outside return_book (admin, cascades) frees the book
+    if instance.status == 'ACCEPTED':
+        Book.objects.filter(id=instance.book_id).sync_availability()
+
+
+# response cache tags, see apps/books/cache.py
+@receiver(post_init, sender=Book)
+def remember_category(sender, instance, **kwargs):
+    # read through __dict__ so deferred (.only()) rows don't load the field
+    instance._loaded_category_id = instance.__dict__.get('category_id')
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_pages(sender, instance, **kwargs):
+    category_ids = {instance.category_id, getattr(instance, '_loaded_category_id', None)} - {None}
+    invalidate_tags('books', *(f'category:{pk}' for pk in category_ids))
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver([post_save, post_delete], sender=Catregory)
+def invalidate_category_pages(sender, instance, **kwargs):
+    invalidate_tags('categories', f'category:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=BookReview)
+def invalidate_rating_pages(sender, instance, **kwargs):
+    invalidate_tags('ratings')
+
+
+@receiver([post_save, post_delete], sender=BorrowRequest)
+def invalidate_availability_pages(sender, instance, **kwargs):
+    # none of the cached listings render availability today, pages that do
+    # should carry this tag
+    invalidate_tags('availability', f'book:{instance.book_id}')
@@ -0,0 +1,69 @@
+import re
+from collections import defaultdict
+
+from django.db.models import Count, IntegerField, Max, Q
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+
+def base_slug(title, max_length=280):
+    # leave room for the "-<n>" suffix inside the 300 char column
+    return slugify(title)[:max_length].strip('-') or 'book'
+
+
+def next_free_slug(queryset, base):
+    """
+    Next free ``base`` / ``base-<n>`` slug from a single aggregate query
+    (exact match plus the highest numeric suffix), instead of probing
+    suffixes one query at a time.
+    """
+    suffixed = Q(slug__startswith=f'{base}-', slug__regex=rf'^{re.escape(base)}-[0-9]+$')
+    taken = queryset.filter(Q(slug=base) | suffixed).aggregate(
+        exact=Count('id', filter=Q(slug=base)),
+        top=Max(Cast(Substr('slug', len(base) + 2), IntegerField()), filter=suffixed),
+    )
+    if not taken['exact'] and taken['top'] is None:
+        return base
+    return f"{base}-{(taken['top'] or 0) + 1}"
+
+
+def assign_slugs(books, chunk_size=500):
+    """
+    Fill in ``slug`` for many unsaved books at once, e.g. before
+    bulk_create. Existing slugs are read with one query per ``chunk_size``
+    distinct base slugs, and duplicates inside the batch are numbered in
+    memory. Every candidate is checked against the slugs taken so far, in
+    the table and in this batch, since one title's base can be another
+    title's numbered slug ("Intro 1" vs. the second "Intro").
+    """
+    books = [book for book in books if not book.slug]
+    if not books:
+        return books
+    model = type(books[0])
+    by_base = defaultdict(list)
+    for book in books:
+        by_base[base_slug(book.title)].append(book)
+
+    bases = list(by_base)
+    taken = set()
+    for start in range(0, len(bases), chunk_size):
+        chunk = bases[start:start + chunk_size]
+        pattern = '^(' + '|'.join(re.escape(base) for base in chunk) + ')-[0-9]+$'
+        existing = model._default_manager.filter(Q(slug__in=chunk) | Q(slug__regex=pattern)).values_list('slug', flat=True)
+        top = defaultdict(int)
+        for slug in existing:
+            taken.add(slug)
+            base, _, suffix = slug.rpartition('-')
+            if suffix.isdigit():
+                top[base] = max(top[base], int(suffix))
+
+        for base in chunk:
+            counter = top[base]
+            for book in by_base[base]:
+                slug = base
+                while slug in taken:
+                    counter += 1
+                    slug = f'{base}-{counter}'
+                taken.add(slug)
+                book.slug = slug
+    return books
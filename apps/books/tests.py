@@ -1,3 +1,999 @@
-from django.test import TestCase
+import csv
+import itertools
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.db.models import F
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.accounts import stats
+from apps.accounts.models import EmailOutbox, User
+from src.asgi import application
+
+from . import borrowing
+from .autocomplete import AutocompleteIndex, PrefixIndex, autocomplete_index, load_titles
+from .covers import build_book_variants, generate_variants
+from .exporter import export_rows
+from .images import ImageFetchError, PinnedAddressAdapter, check_host, fetch_image, ingest_book_image
+from .models import Book, BookReview, BorrowRequest, Catregory, Comment, Comment_vote
+from .overdue import mark_overdue_loans
+from .pagination import KeysetPagination
+from .ratings import toggle_review
+from .search import FTS_TABLE
+from .serializers import BookDetailSerializer
+from .slugs import assign_slugs
+from .votes import VoteCounterBuffer, apply_counter_deltas, toggle_vote, vote_buffer
+
+
+def make_user(name, **extra):
+    # an unusable password: hashing one per user would dominate the race tests
+    return User.objects.create_user(name=name, email=f'{name}@example.com', password=None, is_active=True, **extra)
+
+
+def run_concurrently(*calls):
+    """
+    Start every call on its own thread behind a barrier, so they hit the
+    database together. Returns each call's result, or the exception it raised.
+    """
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(index, call):
+        barrier.wait()
+        try:
+            results[index] = call()
+        except Exception as exc:
+            results[index] = exc
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=pair) for pair in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        owner = make_user('owner')
+        self.books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author='x', owner=owner, language='en') for i in range(25)
+        ])
+
+    def walk(self, ordering, page_size=7):
+        paginator = KeysetPagination(ordering)
+        factory = RequestFactory()
+        params = {'page_size': page_size}
+        ids = []
+        while True:
+            page = paginator.paginate_queryset(Book.objects.all(), factory.get('/', params))
+            ids += [book.id for book in page]
+            if paginator.next_position is None:
+                return ids, paginator
+            params['cursor'] = paginator.encode_cursor(paginator.next_position)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        # bulk_create gives most rows the same created_at, so the id tiebreak matters
+        ids, _ = self.walk(('-created_at', '-id'))
+        self.assertEqual(ids, sorted((book.id for book in self.books), reverse=True))
+        ids, _ = self.walk(('created_at', 'id'))
+        self.assertEqual(ids, sorted(book.id for book in self.books))
+
+    def test_cursor_filter_seeks_the_index(self):
+        paginator = KeysetPagination(('-created_at', '-id'))
+        position = paginator._position(Book.objects.order_by('-created_at', '-id')[10])
+        plan = Book.objects.order_by('-created_at', '-id').filter(paginator._after(position)).explain()
+        self.assertIn('SEARCH', plan)
+        self.assertIn('created_at<', plan.replace(' ', ''))
+
+    def test_page_size_is_clamped(self):
+        for page_size, expected in (('0', 1), ('-3', 1), ('1000', 25), ('lots', 20)):
+            with self.subTest(page_size=page_size):
+                response = self.client.get('/api/v1/books/book-list/', {'page_size': page_size})
+                self.assertEqual(len(response.data['data']), expected)
+
+    def test_malformed_cursors_are_not_found(self):
+        paginator = KeysetPagination(('-created_at', '-id'))
+        for cursor in ('garbage', paginator.encode_cursor(['2026-01-01T00:00:00+00:00']),
+                       paginator.encode_cursor(['not a date', 1]), paginator.encode_cursor({'id': 1})):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/v1/books/book-list/', {'cursor': cursor}).status_code, 404)
+
+    def test_rows_added_behind_the_cursor_do_not_shift_the_next_page(self):
+        first = self.client.get('/api/v1/books/book-list/', {'page_size': 10}).data
+        Book.objects.create(title='Newest', author='x', owner=self.books[0].owner, language='en')
+        second = self.client.get(first['next']).data
+        expected = sorted((book.id for book in self.books), reverse=True)[10:20]
+        self.assertEqual([book['id'] for book in second['data']], expected)
+
+    def test_a_full_last_page_has_no_next_link(self):
+        ids, paginator = self.walk(('-created_at', '-id'), page_size=5)
+        self.assertEqual(len(ids), 25)
+        self.assertIsNone(paginator.get_next_link())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.client = APIClient()
+
+    def book(self, title, **fields):
+        return Book.objects.create(title=title, author=fields.pop('author', 'x'), owner=self.owner, language='en', **fields)
+
+    def search(self, q, **params):
+        response = self.client.get('/api/v1/books/book-search/', {'q': q, **params})
+        if response.status_code == 404:
+            return []
+        self.assertEqual(response.status_code, 200)
+        return [book['title'] for book in response.data['data']]
+
+    def test_title_matches_outrank_description_matches(self):
+        self.book('Arrakis Notes', short_description='a companion to dune')
+        self.book('Dune')
+        self.book('Emma', author='Dune Author')
+        self.assertEqual(self.search('dune'), ['Dune', 'Emma', 'Arrakis Notes'])
+
+    def test_words_match_as_prefixes_and_never_as_fts_syntax(self):
+        self.book('Foundation and Empire')
+        self.assertEqual(self.search('found emp'), ['Foundation and Empire'])
+        self.assertEqual(self.search('"found* OR NEAR(x'), [])
+        self.assertEqual(self.client.get('/api/v1/books/book-search/').status_code, 400)
+
+    def test_the_index_follows_saves_deletes_and_category_renames(self):
+        category = Catregory.objects.create(name='Space Opera')
+        book = self.book('Dune', category=category)
+        gone = self.book('Emma')
+        book.title = 'Children of Dune'
+        book.save()
+        gone.delete()
+        category.name = 'Desert Planet'
+        category.save()
+        self.assertEqual(self.search('children'), ['Children of Dune'])
+        self.assertEqual(self.search('emma'), [])
+        self.assertEqual(self.search('desert'), ['Children of Dune'])
+        self.assertEqual(self.search('opera'), [])
+
+    def test_results_are_paged(self):
+        for i in range(3):
+            self.book(f'Dune {i}')
+        response = self.client.get('/api/v1/books/book-search/', {'q': 'dune', 'page_size': 2})
+        self.assertEqual(len(response.data['data']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual((len(response.data['data']), response.data['next']), (1, None))
+
+    def test_reindex_rebuilds_the_whole_catalog(self):
+        self.book('Dune')
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.assertEqual(self.search('dune'), [])
+        call_command('reindex_books', stdout=StringIO())
+        self.assertEqual(self.search('dune'), ['Dune'])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', owner=self.owner, language='en')
+        self.emma = Book.objects.create(title='Emma', author='Jane Austen', owner=self.owner, language='en')
+
+    def test_any_word_start_matches_regardless_of_case_and_accents(self):
+        index = PrefixIndex()
+        index.build([(1, 'Introduction to Algorithms', 'Cormen'), (2, 'Les Misérables', 'Victor Hugo'),
+                     (3, 'Algorithms', 'Sedgewick')])
+        self.assertEqual([row['id'] for row in index.lookup('ALGO')], [1, 3])
+        self.assertEqual([row['id'] for row in index.lookup('miser')], [2])
+        self.assertEqual([row['id'] for row in index.lookup('victor h')], [2])
+        self.assertEqual(index.lookup('algo', limit=1), [{"id": 1, "title": 'Introduction to Algorithms', "author": 'Cormen'}])
+        self.assertEqual(index.lookup('  '), [])
+
+    def test_endpoint_serves_the_process_index(self):
+        autocomplete_index.reset()
+        self.addCleanup(autocomplete_index.reset)
+        response = self.client.get('/api/v1/books/autocomplete/', {'q': 'herb'})
+        self.assertEqual(response.data['data'], [{"id": self.dune.id, "title": 'Dune', "author": 'Frank Herbert'}])
+        Book.objects.create(title='Herbs', author='x', owner=self.owner, language='en')
+        response = self.client.get('/api/v1/books/autocomplete/', {'q': 'herb'})
+        self.assertEqual(len(response.data['data']), 2)
+        self.assertEqual(self.client.get('/api/v1/books/autocomplete/').status_code, 400)
+
+    def test_refresh_drops_books_deleted_by_another_worker(self):
+        # a second index stands in for another worker: the delete signal only
+        # reaches the module-level one
+        worker = AutocompleteIndex()
+        self.assertEqual([row['id'] for row in worker.get().lookup('du')], [self.dune.id])
+        self.dune.delete()
+        worker._refresh()
+        self.assertEqual(worker.get().lookup('du'), [])
+        self.assertEqual(worker.get().ids(), {self.emma.id})
+
+    def test_compact_mode_keeps_no_titles_in_memory(self):
+        index = PrefixIndex(compact=True, loader=load_titles)
+        index.build(Book.objects.values_list('id', 'title', 'author'))
+        self.assertEqual(len(index), 4)
+        self.assertNotIn('Dune', repr(index.books))
+        self.assertEqual(index.lookup('jane'), [{"id": self.emma.id, "title": 'Emma', "author": 'Jane Austen'}])
+        index.remove(self.emma.id)
+        self.assertEqual(index.lookup('jane'), [])
+        self.assertEqual(len(index), 2)
+
+    def test_lookups_racing_writes_see_every_unchanged_book(self):
+        index = PrefixIndex()
+        index.build([(1, 'Dune', 'Frank Herbert')])
+        stop = threading.Event()
+
+        def churn():
+            # entries sorting before "dune" shift it on every insert and delete
+            while not stop.is_set():
+                for pk in range(100, 150):
+                    index.add(pk, f'Dua {pk}', '')
+                for pk in range(100, 150):
+                    index.remove(pk)
+
+        writer = threading.Thread(target=churn)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        writer.start()
+        try:
+            missed = sum(1 not in [row['id'] for row in index.lookup('du', limit=100)] for _ in range(3000))
+        finally:
+            stop.set()
+            writer.join()
+            sys.setswitchinterval(interval)
+        self.assertEqual(missed, 0)
+
+
+COVER_VARIANTS = {'thumb': 'covers/1/thumb.jpg', 'thumb_webp': 'covers/1/thumb.webp', 'thumb_width': 160}
+
+
+class BookDetailsETagTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.book = Book.objects.create(title='Dune', author='x', owner=self.owner, language='en')
+        self.url = f'/api/v1/books/book-details/{self.book.id}/'
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        return response['ETag']
+
+    def assertRevalidates(self, change):
+        etag = self.etag()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertNotEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_changes_that_move_no_timestamp_invalidate_the_etag(self):
+        comment = Comment.objects.create(user=self.owner, book=self.book, content='hi')
+        self.assertRevalidates(lambda: Comment.objects.filter(pk=comment.pk).update(upvotes=F('upvotes') + 1))
+        self.assertRevalidates(lambda: Comment.objects.filter(pk=comment.pk).delete())
+        self.assertRevalidates(lambda: Book.objects.filter(pk=self.book.pk).update(is_available=False))
+        self.assertRevalidates(lambda: Book.objects.filter(pk=self.book.pk).update(image_status='FAILED'))
+        self.assertRevalidates(
+            lambda: Book.objects.filter(pk=self.book.pk).update(cover_variants=COVER_VARIANTS))
+
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.book = Book.objects.create(title='Dune', author='x', owner=self.owner, language='en')
+        self.url = f'/api/v1/books/book-details/{self.book.id}/'
+
+    def comment(self, content, parent=None):
+        return Comment.objects.create(user=self.owner, book=self.book, content=content, parent=parent)
+
+    def thread(self, *contents):
+        """A chain of replies, each answering the previous one."""
+        parent = None
+        for content in contents:
+            parent = self.comment(content, parent)
+        return parent
+
+    def details(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_query_count_does_not_grow_with_the_thread(self):
+        self.thread('a', 'a1')
+        with CaptureQueriesContext(connection) as small:
+            self.details()
+        for i in range(10):
+            self.thread(f'r{i}', f'r{i}.1', f'r{i}.2')
+        with self.assertNumQueries(len(small)):
+            self.details()
+
+    def test_only_root_comments_are_paged(self):
+        for content in ('a', 'b', 'c'):
+            self.thread(content, f'{content}1')
+        data = self.details(comments_page_size=2)
+        self.assertEqual([c['content'] for c in data['comments']], ['a', 'b'])
+        self.assertEqual([r['content'] for r in data['comments'][0]['replies']], ['a1'])
+        data = self.client.get(data['comments_next']).data['data']
+        self.assertEqual(([c['content'] for c in data['comments']], data['comments_next']), (['c'], None))
+
+    @override_settings(BOOK_COMMENT_MAX_DEPTH=3)
+    def test_deep_threads_end_in_a_load_more_link(self):
+        self.thread('a', 'b', 'c', 'd', 'e')
+        b = self.details()['comments'][0]['replies'][0]
+        c = b['replies'][0]
+        self.assertEqual((c['content'], c['replies']), ('c', []))
+        self.assertTrue(c['more_replies'].endswith(f'/comment-replies/{c["id"]}/'))
+        data = self.client.get(c['more_replies']).data['data']
+        self.assertEqual([d['content'] for d in data], ['d'])
+        self.assertEqual([e['content'] for e in data[0]['replies']], ['e'])
+
+
+class VoteCounterTests(TransactionTestCase):
+    def setUp(self):
+        owner = make_user('owner')
+        book = Book.objects.create(title='Dune', author='x', owner=owner, language='en')
+        self.comment = Comment.objects.create(user=owner, book=book, content='hi')
+
+    def counts(self):
+        return Comment.objects.filter(pk=self.comment.pk).values_list('upvotes', 'downvotes').get()
+
+    def test_decrement_on_a_drifted_counter_clamps_at_zero(self):
+        apply_counter_deltas({self.comment.pk: {'upvotes': -1, 'downvotes': 2}})
+        self.assertEqual(self.counts(), (0, 2))
+
+    @override_settings(COMMENT_VOTE_FLUSH_SECONDS=0.2, COMMENT_VOTE_FLUSH_SIZE=500)
+    def test_quiet_buffer_is_flushed_by_the_timer(self):
+        buffer = VoteCounterBuffer()
+        buffer.add(self.comment.pk, {'upvotes': 1})
+        self.assertEqual(self.counts(), (0, 0))
+        deadline = time.monotonic() + 5
+        while self.counts() != (1, 0) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(buffer.pending, {})
+
+    def vote_concurrently(self, users):
+        results = run_concurrently(*[lambda user=user: toggle_vote(user, self.comment.pk, 'upvote') for user in users])
+        self.assertEqual([r for r in results if isinstance(r, Exception)], [])
+        return results
+
+    def test_concurrent_votes_are_all_counted(self):
+        self.vote_concurrently([make_user(f'voter{i}') for i in range(12)])
+        self.assertEqual(self.counts(), (12, 0))
+
+    def test_racing_toggles_by_one_user_keep_the_counter_in_step(self):
+        voter = make_user('voter')
+        for _ in range(3):
+            self.vote_concurrently([voter, voter])
+            self.assertEqual(self.counts()[0], Comment_vote.objects.filter(comment=self.comment).count())
+
+    @override_settings(COMMENT_VOTE_WRITE_BEHIND=True, COMMENT_VOTE_FLUSH_SIZE=3, COMMENT_VOTE_FLUSH_SECONDS=60)
+    def test_write_behind_votes_survive_concurrent_flushes(self):
+        # other comments fill the buffer, so the voting threads flush it too
+        others = [Comment.objects.create(user=self.comment.user, book=self.comment.book, content=str(i))
+                  for i in range(4)]
+        voters = [make_user(f'voter{i}') for i in range(12)]
+        calls = [lambda user=user: toggle_vote(user, self.comment.pk, 'upvote') for user in voters]
+        calls += [lambda user=user, other=other: toggle_vote(user, other.pk, 'downvote')
+                  for user in voters[:3] for other in others]
+        results = run_concurrently(*calls)
+        self.assertEqual([r for r in results if isinstance(r, Exception)], [])
+        vote_buffer.flush()
+        self.assertEqual(self.counts(), (12, 0))
+        self.assertEqual(list(Comment.objects.filter(pk__in=[o.pk for o in others]).values_list('downvotes', flat=True)),
+                         [3] * 4)
+
+
+class ReviewToggleTests(TransactionTestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Dune', author='x', owner=make_user('owner'), language='en')
+
+    def rating(self):
+        return Book.objects.get(pk=self.book.pk).rating
+
+    def test_toggling_adds_and_removes_the_review(self):
+        client = APIClient()
+        client.force_authenticate(make_user('reader'))
+        response = client.post(f'/api/v1/books/book-review/{self.book.pk}/')
+        self.assertEqual((response.status_code, response.data), (201, {'rating': 1}))
+        response = client.post(f'/api/v1/books/book-review/{self.book.pk}/')
+        self.assertEqual((response.status_code, response.data), (200, {'rating': 0}))
+        self.assertFalse(BookReview.objects.exists())
+        self.assertEqual(client.post('/api/v1/books/book-review/0/').status_code, 404)
+        # a review doesn't reorder updated_books
+        self.assertEqual(Book.objects.get(pk=self.book.pk).updated_at, self.book.updated_at)
+
+    def review_concurrently(self, users):
+        results = run_concurrently(*[lambda user=user: toggle_review(user, self.book.pk) for user in users])
+        self.assertEqual([r for r in results if isinstance(r, Exception)], [])
+        return results
+
+    def test_concurrent_reviews_are_all_counted(self):
+        self.review_concurrently([make_user(f'reader{i}') for i in range(12)])
+        self.assertEqual(self.rating(), 12)
+
+    def test_racing_toggles_by_one_user_keep_the_rating_in_step(self):
+        reader = make_user('reader')
+        for _ in range(3):
+            self.review_concurrently([reader, reader])
+            self.assertEqual(self.rating(), BookReview.objects.filter(book=self.book).count())
+
+
+class AssignSlugsTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+
+    def unsaved(self, *titles):
+        return [Book(title=title, author='x', owner=self.owner, language='en') for title in titles]
+
+    def test_a_base_that_is_another_titles_numbered_slug_stays_unique(self):
+        Book.objects.bulk_create([
+            Book(title='Intro', slug='intro', author='x', owner=self.owner, language='en'),
+            Book(title='Intro', slug='intro-1', author='x', owner=self.owner, language='en'),
+        ])
+        for chunk_size in (500, 1):
+            books = assign_slugs(self.unsaved('Intro', 'Intro 1', 'Intro 2', 'Intro', 'Intro 1'), chunk_size=chunk_size)
+            slugs = [book.slug for book in books]
+            self.assertEqual(len(set(slugs)), len(slugs))
+            self.assertFalse(Book.objects.filter(slug__in=slugs).exists())
+        Book.objects.bulk_create(books)
+        self.assertEqual(Book.objects.count(), 7)
+
+    def test_free_bases_are_used_as_is(self):
+        books = assign_slugs(self.unsaved('Dune', 'Emma', 'Dune'))
+        self.assertEqual([book.slug for book in books], ['dune', 'emma', 'dune-1'])
+
+
+def png():
+    out = BytesIO()
+    Image.new('RGB', (2, 2)).save(out, 'PNG')
+    return out.getvalue()
+
+
+def response(status_code, body=b'', **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    response.raw = BytesIO(body)
+    return response
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = dict(responses)
+        self.requested = []
+        self.headers = []
+
+    def get(self, url, **kwargs):
+        assert kwargs['allow_redirects'] is False
+        self.requested.append(url)
+        self.headers.append(kwargs.get('headers', {}))
+        return self.responses[url]
+
+
+class ImageFetchTests(TestCase):
+    def test_private_and_non_http_hosts_are_refused(self):
+        for url in ('http://127.0.0.1/a.png', 'http://localhost/a.png', 'http://10.0.0.5/a.png',
+                    'http://169.254.169.254/latest/meta-data', 'http://[::ffff:127.0.0.1]/a.png',
+                    'http://0.0.0.0/a.png', 'file:///etc/passwd'):
+            with self.subTest(url=url), self.assertRaises(ImageFetchError):
+                check_host(url)
+        check_host('http://93.184.216.34/a.png')
+
+    def test_redirects_are_checked_hop_by_hop(self):
+        session = FakeSession({
+            'http://93.184.216.34/a.png': response(302, Location='/b.png'),
+            'http://93.184.216.34/b.png': response(200, png(), **{'Content-Type': 'image/png'}),
+        })
+        self.assertEqual(fetch_image('http://93.184.216.34/a.png', session)[1], 'png')
+
+        session = FakeSession({
+            'http://93.184.216.34/a.png': response(301, Location='http://169.254.169.254/latest/meta-data'),
+        })
+        with self.assertRaisesMessage(ImageFetchError, 'private address'):
+            fetch_image('http://93.184.216.34/a.png', session)
+        self.assertEqual(session.requested, ['http://93.184.216.34/a.png'])
+
+    def test_redirect_loops_give_up(self):
+        session = FakeSession({})
+        session.get = lambda url, **kwargs: response(302, Location='/a.png')
+        with self.assertRaisesMessage(ImageFetchError, 'Too many redirects'):
+            fetch_image('http://93.184.216.34/a.png', session)
+
+    def test_the_checked_address_is_the_one_requested(self):
+        public = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('93.184.216.34', 0))]
+        private = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 0))]
+        session = FakeSession({
+            'http://93.184.216.34:8080/a.png': response(200, png(), **{'Content-Type': 'image/png'}),
+        })
+        # a rebinding server answers the check with a public address and
+        # any later lookup with a private one
+        with mock.patch('socket.getaddrinfo', side_effect=[public, private]):
+            self.assertEqual(fetch_image('http://covers.example:8080/a.png', session)[1], 'png')
+        self.assertEqual(session.headers, [{'Host': 'covers.example:8080'}])
+
+    def test_tls_to_a_pinned_address_verifies_the_host_name(self):
+        request = requests.Request('GET', 'https://93.184.216.34/a.png', headers={'Host': 'covers.example'}).prepare()
+        pool = PinnedAddressAdapter().get_connection_with_tls_context(request, True)
+        self.assertEqual(pool.host, '93.184.216.34')
+        self.assertEqual((pool.conn_kw['server_hostname'], pool.assert_hostname), ('covers.example', 'covers.example'))
+
+    def test_a_trickling_body_is_cut_off_at_the_deadline(self):
+        trickle = response(200, **{'Content-Type': 'image/png'})
+        trickle.raw = mock.Mock(read1=mock.Mock(return_value=b'x'))
+        session = FakeSession({'http://93.184.216.34/a.png': trickle})
+        # every clock read is a second later
+        with override_settings(BOOK_IMAGE_TIMEOUT=10), \
+                mock.patch('apps.books.images.time.monotonic', side_effect=itertools.count()), \
+                self.assertRaisesMessage(ImageFetchError, 'timed out'):
+            fetch_image('http://93.184.216.34/a.png', session)
+        self.assertLessEqual(trickle.raw.read1.call_count, 10)
+
+    @override_settings(BOOK_IMAGE_MAX_PIXELS=3)
+    def test_oversized_dimensions_are_refused_before_decoding(self):
+        session = FakeSession({
+            'http://93.184.216.34/a.png': response(200, png(), **{'Content-Type': 'image/png'}),
+        })
+        with self.assertRaisesMessage(ImageFetchError, 'dimensions'):
+            fetch_image('http://93.184.216.34/a.png', session)
+
+    def test_unexpected_errors_mark_the_book_failed(self):
+        book = Book.objects.create(
+            title='Dune', author='x', owner=make_user('owner'), language='en',
+            image_source_url='http://93.184.216.34/a.png', image_status='PENDING',
+        )
+        with mock.patch('apps.books.images.fetch_image', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('apps.books.images', 'ERROR'):
+            self.assertEqual(ingest_book_image(book.pk), 'FAILED')
+        updated_at = book.updated_at
+        book.refresh_from_db()
+        self.assertEqual(book.image_status, 'FAILED')
+        self.assertGreater(book.updated_at, updated_at)
+
+
+class CoverVariantTests(TestCase):
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, BOOK_COVER_SIZES={'thumb': 160, 'medium': 480}))
+        self.owner = make_user('owner')
+
+    def upload(self, name, size=(1200, 1800)):
+        os.makedirs(os.path.join(self.media, 'book_images'), exist_ok=True)
+        path = f'book_images/{name}.png'
+        Image.new('RGBA', size, 'red').save(os.path.join(self.media, path))
+        return Book.objects.create(title=name, author='x', owner=self.owner, language='en', book_image=path)
+
+    def test_every_width_gets_a_jpeg_and_a_webp(self):
+        self.upload('dune')
+        variants = generate_variants(self.media, 'book_images/dune.png', {'thumb': 160, 'medium': 480})
+        self.assertEqual((variants['thumb_width'], variants['medium_width']), (160, 480))
+        for key, fmt in (('thumb', 'JPEG'), ('thumb_webp', 'WEBP'), ('medium', 'JPEG'), ('medium_webp', 'WEBP')):
+            with Image.open(os.path.join(self.media, variants[key])) as image:
+                self.assertEqual(image.format, fmt)
+        # never upscaled
+        variants = generate_variants(self.media, 'book_images/dune.png', {'huge': 4000})
+        self.assertEqual(variants['huge_width'], 1200)
+
+    def test_list_responses_carry_a_srcset(self):
+        book = self.upload('dune')
+        build_book_variants(book.pk)
+        cover = self.client.get('/api/v1/books/book-list/').data['data'][0]['cover']
+        self.assertEqual(cover['srcset'], f"{cover['thumb']} 160w, {cover['medium']} 480w")
+        self.assertTrue(cover['webp_srcset'].startswith(f"{cover['thumb_webp']} 160w"))
+        self.assertTrue(cover['thumb'].endswith('book_images/dune.thumb.jpg'))
+
+    def test_backfill_builds_missing_variants(self):
+        books = [self.upload(name) for name in ('dune', 'emma')]
+        Book.objects.create(title='No cover', author='x', owner=self.owner, language='en')
+        call_command('build_cover_variants', processes=1, stdout=StringIO())
+        for book in books:
+            book.refresh_from_db()
+            self.assertEqual(book.cover_variants['thumb'], f'book_images/{book.title}.thumb.jpg')
+            self.assertTrue(os.path.exists(os.path.join(self.media, book.cover_variants['medium_webp'])))
+
+
+class BookImportTests(TestCase):
+    def setUp(self):
+        self.admin = make_user('admin', role='ADMIN')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, rows, **data):
+        body = 'title,author,language\n' + ''.join(f'{title},x,en\n' for title in rows)
+        file = SimpleUploadedFile('books.csv', body.encode(), content_type='text/csv')
+        return self.client.post('/api/v1/books/book-import/', {'file': file, **data}, format='multipart')
+
+    def test_titles_clashing_with_existing_numbered_slugs_import(self):
+        Book.objects.bulk_create([
+            Book(title='Intro', slug=slug, author='x', owner=self.admin, language='en') for slug in ('intro', 'intro-1')
+        ])
+        response = self.upload(['Intro', 'Intro 1', 'Intro', ''])
+        self.assertEqual(response.status_code, 201)
+        report = response.data['data']
+        self.assertEqual((report['rows'], report['created'], report['failed']), (4, 3, 1))
+        self.assertEqual(Book.objects.count(), 5)
+
+    def test_a_failing_chunk_is_reported_and_the_rest_imported(self):
+        create = Book.objects.bulk_create
+        calls = []
+
+        def flaky(objs, **kwargs):
+            calls.append(len(objs))
+            # the first chunk keeps failing, the second goes through
+            if len(calls) <= 2:
+                raise IntegrityError('UNIQUE constraint failed: books_book.slug')
+            return create(objs, **kwargs)
+
+        with mock.patch.object(Book.objects, 'bulk_create', side_effect=flaky):
+            response = self.upload(['A', 'B', 'C'], chunk_size=2)
+        self.assertEqual(response.status_code, 201)
+        report = response.data['data']
+        self.assertEqual((report['created'], report['failed']), (1, 2))
+        self.assertEqual([error['line'] for error in report['errors']], [2, 3])
+        self.assertIn('UNIQUE constraint failed', report['errors'][0]['error'])
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['C'])
+
+    def test_chunk_size_is_clamped_and_validated(self):
+        for chunk_size in (-1, 0):
+            response = self.upload(['A', 'B'], chunk_size=chunk_size)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['data']['created'], 2)
+        response = self.upload(['C'], chunk_size='lots')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Book.objects.count(), 4)
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.owner, self.reader = make_user('owner'), make_user('reader')
+        self.book = Book.objects.create(title='Dune', author='x', owner=self.owner, language='en')
+
+    def availability(self):
+        """The denormalized column and the live annotation."""
+        return Book.objects.with_live_availability().values_list('is_available', 'live_is_available').get(pk=self.book.pk)
+
+    def test_the_column_follows_accept_and_return(self):
+        loan = borrowing.request_book(self.reader, self.book.pk)
+        self.assertEqual(self.availability(), (True, True))
+        borrowing.accept(loan.pk, self.owner)
+        self.assertEqual(self.availability(), (False, False))
+        borrowing.return_loan(loan.pk, self.reader)
+        self.assertEqual(self.availability(), (True, True))
+
+    def test_the_annotation_overrides_a_drifted_column(self):
+        loan = borrowing.request_book(self.reader, self.book.pk)
+        borrowing.accept(loan.pk, self.owner)
+        Book.objects.filter(pk=self.book.pk).update(is_available=True)
+        with self.assertNumQueries(1):
+            books = list(Book.objects.with_live_availability())
+        self.assertFalse(BookDetailSerializer().get_is_available(books[0]))
+        Book.objects.sync_availability()
+        self.assertEqual(self.availability(), (False, False))
+
+
+class HistoryTests(TestCase):
+    ENDPOINTS = ('borrow-request-page', 'lend-request-page', 'my-requests', 'borrow-request-list', 'lend-request-list')
+
+    def setUp(self):
+        self.owner, self.reader = make_user('olga'), make_user('rui')
+        self.client = APIClient()
+
+    def loan(self, title, status='RETURNED'):
+        book = Book.objects.create(title=title, author='x', owner=self.owner, language='en')
+        return BorrowRequest.objects.create(book=book, requester=self.reader, owner=self.owner, status=status)
+
+    def rows(self, endpoint, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(f'/api/v1/books/{endpoint}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['data'] if isinstance(response.data, dict) else response.data
+
+    def test_rows_are_compact_and_name_the_other_party(self):
+        self.loan('Dune')
+        latest = self.loan('Emma', status='PENDING')
+        row, _ = self.rows('borrow-request-page', self.reader)
+        self.assertEqual(row['id'], latest.pk)
+        self.assertEqual(row['book']['title'], 'Emma')
+        self.assertEqual(row['counterpart'], {'id': self.owner.pk, 'name': 'olga'})
+        self.assertEqual(self.rows('lend-request-list', self.owner)[0]['counterpart'], {'id': self.reader.pk, 'name': 'rui'})
+        self.assertEqual(set(row), {'id', 'book', 'counterpart', 'status', 'created_at', 'accepted_at', 'return_date', 'is_late'})
+
+    def test_query_count_does_not_grow_with_the_history(self):
+        self.loan('Book 0')
+        small = {}
+        for endpoint in self.ENDPOINTS:
+            user = self.owner if endpoint.startswith('lend') else self.reader
+            with CaptureQueriesContext(connection) as queries:
+                self.rows(endpoint, user)
+            small[endpoint] = len(queries)
+        for i in range(1, 20):
+            self.loan(f'Book {i}')
+        for endpoint in self.ENDPOINTS:
+            user = self.owner if endpoint.startswith('lend') else self.reader
+            with self.subTest(endpoint=endpoint), self.assertNumQueries(small[endpoint]):
+                self.assertEqual(len(self.rows(endpoint, user)), 20)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('admin', role='ADMIN'))
+
+    def exported(self, dataset, since):
+        _, rows = export_rows(dataset, since)
+        return [row[0] for row in rows]
+
+    def test_updated_since_sees_state_changes_made_with_update(self):
+        owner, reader = make_user('owner'), make_user('reader')
+        book = Book.objects.create(title='Dune', author='x', owner=owner, language='en')
+        loan = borrowing.request_book(reader, book.pk)
+        borrowing.accept(loan.pk, owner)
+        since = timezone.now()
+        self.assertEqual(self.exported('books', since), [])
+        self.assertEqual(self.exported('borrow-requests', since), [])
+
+        borrowing.return_loan(loan.pk, reader)
+        self.assertEqual(self.exported('borrow-requests', since), [loan.pk])
+        # availability changes don't touch the book's updated_at
+        self.assertEqual(self.exported('books', since), [])
+        self.assertEqual(Book.objects.get(pk=book.pk).updated_at, book.updated_at)
+
+    def download(self, dataset, **params):
+        return self.client.get(f'/api/v1/books/export/{dataset}/', params)
+
+    def test_ndjson_and_csv_stream_one_row_per_line(self):
+        category = Catregory.objects.create(name='Sci-Fi')
+        owner = make_user('owner')
+        Book.objects.create(title='Dune, "the" novel', author='x', owner=owner, language='en', category=category)
+        Book.objects.create(title='Emma', author='y', owner=owner, language='en')
+
+        response = self.download('books')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(row['title'], row['category_name']) for row in rows],
+                         [('Dune, "the" novel', 'Sci-Fi'), ('Emma', None)])
+
+        response = self.download('books', output='csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="books.csv"')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(row['title'], row['category_name']) for row in rows],
+                         [('Dune, "the" novel', 'Sci-Fi'), ('Emma', '')])
+
+    def test_bad_parameters_are_refused(self):
+        self.assertEqual(self.download('passwords').status_code, 404)
+        self.assertEqual(self.download('books', output='xml').status_code, 400)
+        self.assertEqual(self.download('books', updated_since='yesterday').status_code, 400)
+
+
+class NotificationSocketTests(TransactionTestCase):
+    def connect(self, user):
+        async def attempt():
+            communicator = WebsocketCommunicator(application, f'/ws/notifications/?token={AccessToken.for_user(user)}')
+            connected, code = await communicator.connect()
+            await communicator.disconnect()
+            return connected, code
+        return async_to_sync(attempt)()
+
+    def test_only_active_users_connect(self):
+        user = make_user('reader')
+        self.assertEqual(self.connect(user)[0], True)
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        self.assertEqual(self.connect(user), (False, 4401))
+
+    def test_missing_and_bad_tokens_are_closed(self):
+        async def attempt(path):
+            communicator = WebsocketCommunicator(application, path)
+            return await communicator.connect()
+        for path in ('/ws/notifications/', '/ws/notifications/?token=garbage'):
+            with self.subTest(path=path):
+                self.assertEqual(async_to_sync(attempt)(path), (False, 4401))
+
+    def test_borrow_events_reach_both_parties_only(self):
+        owner, reader, other = make_user('owner'), make_user('reader'), make_user('other')
+        book = Book.objects.create(title='Dune', author='x', owner=owner, language='en')
+
+        async def scenario():
+            sockets = {}
+            for user in (owner, reader, other):
+                sockets[user.name] = WebsocketCommunicator(
+                    application, f'/ws/notifications/?token={AccessToken.for_user(user)}')
+                self.assertEqual((await sockets[user.name].connect())[0], True)
+            loan = await database_sync_to_async(borrowing.request_book)(reader, book.pk)
+            received = [await sockets[name].receive_json_from() for name in ('owner', 'reader')]
+            await database_sync_to_async(borrowing.accept)(loan.pk, owner)
+            received += [await sockets[name].receive_json_from() for name in ('owner', 'reader')]
+            self.assertTrue(await sockets['other'].receive_nothing())
+            await sockets['reader'].send_json_to({'type': 'ping'})
+            received.append(await sockets['reader'].receive_json_from())
+            for communicator in sockets.values():
+                await communicator.disconnect()
+            return loan, received
+
+        loan, received = async_to_sync(scenario)()
+        self.assertEqual([message.get('event') for message in received[:4]],
+                         ['borrow_request.created'] * 2 + ['borrow_request.accepted'] * 2)
+        self.assertEqual(received[3]['request']['id'], loan.pk)
+        self.assertEqual((received[3]['request']['status'], received[3]['request']['book']['title']), ('ACCEPTED', 'Dune'))
+        self.assertEqual(received[4], {'type': 'pong'})
+
+
+class BorrowRaceTests(TransactionTestCase):
+    def setUp(self):
+        self.owner, self.reader, self.other = make_user('owner'), make_user('reader'), make_user('other')
+        self.book = Book.objects.create(title='Dune', author='x', owner=self.owner, language='en')
+
+    def race(self, *calls):
+        """Run the calls at once, return their HTTP-ish outcomes."""
+        outcomes = []
+        for result in run_concurrently(*calls):
+            if isinstance(result, borrowing.BorrowError):
+                outcomes.append(result.status_code)
+            else:
+                # any other exception is what the view would turn into a 500
+                outcomes.append(500 if isinstance(result, Exception) else 200)
+        return sorted(outcomes)
+
+    def assertNoDrift(self):
+        self.assertEqual(stats.recount()[1], {})
+
+    def test_one_of_two_requests_for_a_book_is_accepted(self):
+        first = borrowing.request_book(self.reader, self.book.pk)
+        second = borrowing.request_book(self.other, self.book.pk)
+        self.assertEqual(self.race(
+            lambda: borrowing.accept(first.pk, self.owner),
+            lambda: borrowing.accept(second.pk, self.owner),
+        ), [200, 409])
+        self.assertEqual(BorrowRequest.objects.filter(book=self.book, status='ACCEPTED').count(), 1)
+        self.assertFalse(Book.objects.get(pk=self.book.pk).is_available)
+        self.assertNoDrift()
+
+    def test_accept_and_cancel_of_one_request_exclude_each_other(self):
+        # a few rounds, the interleaving differs from one to the next
+        for round in range(6):
+            reader = make_user(f'reader{round}')
+            book = Book.objects.create(title=f'Book {round}', author='x', owner=self.owner, language='en')
+            pending = borrowing.request_book(reader, book.pk)
+            winner, loser = self.race(
+                lambda: borrowing.accept(pending.pk, self.owner),
+                lambda: borrowing.cancel(pending.pk, reader),
+            )
+            self.assertEqual(winner, 200)
+            # a cancel that won deletes the row the accept then can't find
+            self.assertIn(loser, (404, 409))
+            accepted = BorrowRequest.objects.filter(pk=pending.pk, status='ACCEPTED').exists()
+            self.assertEqual(Book.objects.get(pk=book.pk).is_available, not accepted)
+        self.assertNoDrift()
+
+    def test_a_loan_is_returned_once(self):
+        loan = borrowing.accept(borrowing.request_book(self.reader, self.book.pk).pk, self.owner)
+        self.assertEqual(self.race(*[lambda: borrowing.return_loan(loan.pk, self.reader)] * 3), [200, 409, 409])
+        self.assertEqual(BorrowRequest.objects.get(pk=loan.pk).status, 'RETURNED')
+        self.assertFalse(User.objects.get(pk=self.reader.pk).is_borrower)
+        self.assertNoDrift()
+
+    @override_settings(BORROW_MAX_ACTIVE_LOANS=1)
+    def test_loan_limit_holds_under_concurrent_accepts(self):
+        dune = borrowing.request_book(self.reader, self.book.pk)
+        emma = Book.objects.create(title='Emma', author='x', owner=self.owner, language='en')
+        other = borrowing.request_book(self.reader, emma.pk)
+        self.assertEqual(self.race(
+            lambda: borrowing.accept(dune.pk, self.owner),
+            lambda: borrowing.accept(other.pk, self.owner),
+        ), [200, 409])
+        self.assertEqual(BorrowRequest.objects.filter(requester=self.reader, status='ACCEPTED').count(), 1)
+        self.assertNoDrift()
+
+    def test_concurrent_accepts_by_a_stale_owner_count_the_lender_once(self):
+        emma = Book.objects.create(title='Emma', author='x', owner=self.owner, language='en')
+        dune = borrowing.request_book(self.reader, self.book.pk)
+        other = borrowing.request_book(self.other, emma.pk)
+        # both views hold the request.user loaded before either accept
+        self.assertEqual(self.race(
+            lambda: borrowing.accept(dune.pk, self.owner),
+            lambda: borrowing.accept(other.pk, self.owner),
+        ), [200, 200])
+        self.assertFalse(self.owner.is_lender)
+        self.assertNoDrift()
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        # a cache every worker shares, locmem turns the response cache off
+        self.enterContext(override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}))
+        owner = make_user('owner')
+        for title in ('Dune', 'Emma'):
+            Book.objects.create(title=title, author='x', owner=owner, language='en')
+
+    def get(self, **extra):
+        response = self.client.get('/api/v1/books/book-list/', {'page_size': 1}, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeated_requests_hit(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+    def test_writes_purge_the_tagged_pages(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='Ulysses', author='x', owner=make_user('writer'), language='en')
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['data'][0]['title'], 'Ulysses')
+
+    def test_pages_are_not_shared_across_hosts_or_schemes(self):
+        self.get(HTTP_HOST='evil.example')
+        response = self.get(HTTP_HOST='good.example')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.json()['next'].startswith('http://good.example/'))
+        response = self.get(HTTP_HOST='good.example', secure=True)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.json()['next'].startswith('https://good.example/'))
+
+    def test_process_local_cache_is_bypassed(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertNotIn('X-Cache', self.get())
+            self.assertNotIn('X-Cache', self.get())
+
+
+class OverdueScanTests(TestCase):
+    def setUp(self):
+        self.owner, self.reader = make_user('owner'), make_user('reader')
+        self.now = timezone.now()
+
+    def loan(self, due_in_days, status='ACCEPTED'):
+        book = Book.objects.create(title=f'Book {Book.objects.count()}', author='x', owner=self.owner, language='en')
+        return BorrowRequest.objects.create(
+            book=book, requester=self.reader, owner=self.owner, status=status,
+            return_date=self.now + timedelta(days=due_in_days),
+        )
+
+    def late(self):
+        return set(BorrowRequest.objects.filter(is_late=True).values_list('id', flat=True))
+
+    def test_past_due_loans_are_flagged_and_reminded_once(self):
+        overdue = {self.loan(-3).pk, self.loan(-2).pk, self.loan(-1).pk}
+        self.loan(2)
+        self.loan(-5, status='RETURNED')
+        # batches smaller than the backlog still cover all of it
+        self.assertEqual(mark_overdue_loans(batch_size=2, now=self.now), 3)
+        self.assertEqual(self.late(), overdue)
+        self.assertEqual(list(EmailOutbox.objects.values_list('to', flat=True)), [['reader@example.com']] * 3)
+        self.assertEqual(stats.get_stats()['overdue_loans'], 3)
+
+        self.assertEqual(mark_overdue_loans(now=self.now), 0)
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+
+    def test_each_tick_reads_only_loans_that_crossed_since_the_last(self):
+        mark_overdue_loans(now=self.now)
+        upcoming = self.loan(1)
+        # a loan moved into the past by hand sits behind the watermark
+        edited = self.loan(-10)
+        self.assertEqual(mark_overdue_loans(now=self.now + timedelta(days=2)), 1)
+        self.assertEqual(self.late(), {upcoming.pk})
+        self.assertEqual(mark_overdue_loans(now=self.now + timedelta(days=2), full=True), 1)
+        self.assertEqual(self.late(), {upcoming.pk, edited.pk})
@@ -1,20 +1,31 @@
+from django.conf import settings
 from django.urls import path
 from .views import *
 
+if settings.ASYNC_VIEWS:
+    # async twins of the hot endpoints for ASGI deployments
+    from .async_views import (  # noqa: F811
+        book_details, book_list, book_search, wishlist, borrow_request_page, lend_request_page,
+    )
+
 
 urlpatterns = [
     path('book-create/', book_create, name='book_create'),
+    path('book-import/', book_import, name='book_import'),
+    path('export/<str:dataset>/', export_dataset, name='export_dataset'),
     path('book-update/<int:book_id>/', book_update, name='book_update'),
     path('book-details/<int:book_id>/', book_details, name='book_details'),
     path('book-list/', book_list, name='book_list'),
     path('updated-books/', updated_books, name='updated_books'),
     path('top-rated-books/', top_rated_books, name='top_rated_books'),
     path('book-search/', book_search, name='book_search'),
+    path('autocomplete/', book_autocomplete, name='book_autocomplete'),
     path('user-books/', user_books, name='user_books'),
     path('book-delete/<int:book_id>/', book_delete, name='book_delete'),
     path('category-list/', category_list, name='category_list'),
     path('books-by-category/<int:category_id>/', books_by_category, name='books_by_category'),
     path('add-comment/<int:book_id>/', add_comment, name='add_comment'),
+    path('comment-replies/<int:comment_id>/', comment_replies, name='comment_replies'),
     path('edit-comment/<int:comment_id>/', edit_comment, name='edit_comment'),
     path('delete-comment/<int:comment_id>/', delete_comment, name='delete_comment'),
     path('votes-comment/<int:comment_id>/', votes_comment, name='votes_comment'),
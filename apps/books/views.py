@@ -1,22 +1,42 @@
+import csv
 from .models import *
 from .serializers import *
-from apps.accounts.permissions import IsActiveUser, IsSuperAdmin
+from .pagination import paginate, RankedPagination
+from .search import get_search_backend
+from .autocomplete import autocomplete_index
+from .comments import load_comment_children
+from .cache import cache_response
+from .ratings import toggle_review
+from .importer import detect_format, import_books, text_stream
+from .exporter import EXPORT_FORMATS, EXPORTS, export_lines
+from .votes import VOTE_FIELDS, toggle_vote
+from . import borrowing
+from .conditional import book_etag, comment_etag
+from apps.accounts.permissions import IsActiveUser, IsSuperAdmin, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from apps.accounts.authentication import CachedJWTAuthentication
+from apps.accounts.ratelimit import rate_limit
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
 from django.db.models import Count, Avg, Sum, Max, Min
-from django.core.mail import EmailMultiAlternatives
-from django.utils import timezone
+from django.views.decorators.http import condition
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+
+
+# keyset orderings, last column is the unique tiebreaker
+NEWEST_ORDERING = ('-created_at', '-id')
+UPDATED_ORDERING = ('-updated_at', '-id')
+RATING_ORDERING = ('-rating', '-id')
 
 
 # Create your views here.
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def book_create(request):
         serializer = BookCreateUpdateSerializer(data=request.data, context={'request':request})
         serializer.is_valid(raise_exception=True)
@@ -25,9 +45,52 @@ def book_create(request):
         return Response({"message": "Book created successfully", "data": bookSerializer.data}, status=status.HTTP_201_CREATED)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@authentication_classes([CachedJWTAuthentication])
+@parser_classes([MultiPartParser])
+def book_import(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"message": "Please upload a CSV or JSONL file."}, status=status.HTTP_400_BAD_REQUEST)
+    fmt = request.data.get('format') or detect_format(upload.name)
+    if fmt not in ('csv', 'jsonl'):
+        return Response({"message": "Format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        chunk_size = max(1, min(int(request.data.get('chunk_size', 1000)), 5000))
+    except (TypeError, ValueError):
+        return Response({"message": "chunk_size must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        report = import_books(text_stream(upload.file), fmt, request.user, chunk_size=chunk_size)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        return Response({"message": f"Can't read the file: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"message": "Import finished.", "data": report.as_dict()}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@authentication_classes([CachedJWTAuthentication])
+def export_dataset(request, dataset):
+    if dataset not in EXPORTS:
+        return Response({"message": f"Unknown dataset, use one of: {', '.join(sorted(EXPORTS))}."}, status=status.HTTP_404_NOT_FOUND)
+    # ?format= is taken by DRF's renderer negotiation
+    fmt = request.GET.get('output', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return Response({"message": "Output must be ndjson or csv."}, status=status.HTTP_400_BAD_REQUEST)
+    since = None
+    if request.GET.get('updated_since'):
+        since = parse_datetime(request.GET['updated_since'])
+        if since is None:
+            return Response({"message": "updated_since must be an ISO 8601 datetime."}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(export_lines(dataset, fmt, since), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated, IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def book_update(request, book_id):
         book = get_object_or_404(Book, id=book_id, owner=request.user)
         serializer = BookCreateUpdateSerializer(book, data=request.data, partial=True)
@@ -37,6 +100,7 @@ def book_update(request, book_id):
         return Response({"message": "Book updated successfully", "data": bookSerializer.data}, status=status.HTTP_200_OK)
 
 
+@condition(etag_func=book_etag)
 @api_view(['GET'])
 def book_details(request, book_id):
         book = get_object_or_404(Book, id=book_id)
@@ -44,11 +108,11 @@ def book_details(request, book_id):
         return Response({"data": serializer.data}, status=status.HTTP_200_OK)
 
 
+@cache_response(['books'])
 @api_view(['GET'])
 def book_list(request):
         books = Book.objects.all()
-        serializer = BookListSerializer(books, many=True)
-        return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+        return paginate(request, books, BookListSerializer, NEWEST_ORDERING)
 
 
 @api_view(['GET'])
@@ -56,41 +120,53 @@ def book_search(request):
     query = request.GET.get('q', '')
     if not query:
         return Response({"message": "Please provide a search query."}, status=status.HTTP_400_BAD_REQUEST) 
-    books = Book.objects.filter(Q(title__icontains=query) |
-                                    Q(author__icontains=query) |
-                                    Q(category__name__icontains=query)).distinct()
-    if not books.exists():
+    backend = get_search_backend()
+    paginator = RankedPagination(lambda offset, limit: backend.search(query, offset, limit))
+    books = paginator.paginate_queryset(Book.objects.all(), request)
+    if not books and paginator.page == 1:
         return Response({"message": "No books found."}, status=status.HTTP_404_NOT_FOUND)
     serializer = BookListSerializer(books, many=True)
-    return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+def book_autocomplete(request):
+    query = request.GET.get('q', '')
+    if not query:
+        return Response({"message": "Please provide a search query."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 25))
+    except ValueError:
+        limit = 10
+    suggestions = autocomplete_index.get().lookup(query, limit)
+    return Response({"data": suggestions}, status=status.HTTP_200_OK)
 
 
+@cache_response(['books', 'ratings'])
 @api_view(['GET'])
 def top_rated_books(request):
-    books = Book.objects.filter(rating__gt=4).order_by('-rating')
-    serializer = BookListSerializer(books, many=True)
-    return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+    books = Book.objects.filter(rating__gt=4)
+    return paginate(request, books, BookListSerializer, RATING_ORDERING)
 
 
+@cache_response(['books'])
 @api_view(['GET'])
 def updated_books(request):
-        books = Book.objects.all().order_by('-updated_at')
-        serializer = BookListSerializer(books, many=True)
-        return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+        books = Book.objects.all()
+        return paginate(request, books, BookListSerializer, UPDATED_ORDERING)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def user_books(request):
         books = Book.objects.filter(owner=request.user)
-        serializer = BookListSerializer(books, many=True)
-        return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+        return paginate(request, books, BookListSerializer, NEWEST_ORDERING)
 
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def book_delete(request, book_id):
     book = get_object_or_404(Book, id=book_id)
     if book.owner != request.user:
@@ -100,6 +176,7 @@ def book_delete(request, book_id):
     return Response({"message": "Book deleted successfully"}, status=status.HTTP_200_OK)
         
 
+@cache_response(['categories'])
 @api_view(['GET'])
 def category_list(request):
         categories = Catregory.objects.all()
@@ -107,17 +184,17 @@ def category_list(request):
         return Response({"data": serializers.data}, status=status.HTTP_200_OK)
 
 
+@cache_response(lambda category_id: ['categories', f'category:{category_id}'])
 @api_view(["GET"])
 def books_by_category(request, category_id):
     category = get_object_or_404(Catregory, id=category_id)
     books = Book.objects.filter(category=category)
-    serializer = BookListSerializer(books, many=True)
-    return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+    return paginate(request, books, BookListSerializer, NEWEST_ORDERING)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def add_comment(request, book_id):
     book = get_object_or_404(Book, pk=book_id)
     serializer = CommentSerializer(data=request.data)
@@ -126,9 +203,19 @@ def add_comment(request, book_id):
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+@condition(etag_func=comment_etag)
+@api_view(['GET'])
+def comment_replies(request, comment_id):
+    comment = get_object_or_404(Comment, pk=comment_id)
+    children = load_comment_children(comment.book_id)
+    context = {'request': request, 'comment_children': children}
+    serializer = CommentSerializer(children.get(comment.id, []), many=True, context=context)
+    return Response({"data": serializer.data}, status=status.HTTP_200_OK)
+
+
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def edit_comment(requset, comment_id):
         comment = get_object_or_404(Comment, pk=comment_id)
         if comment.user != requset.user:
@@ -141,7 +228,7 @@ def edit_comment(requset, comment_id):
       
 @api_view(['DELETE']) 
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def delete_comment(request,comment_id):
     comment = get_object_or_404(Comment, pk=comment_id)
     if comment.user != request.user:
@@ -153,37 +240,18 @@ def delete_comment(request,comment_id):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def votes_comment(request, comment_id):
     vote_type = request.data.get("vote")
-    comment = get_object_or_404(Comment, id=comment_id)
-    existing_vote = Comment_vote.objects.filter(user=request.user, comment=comment).first()
-    if existing_vote and existing_vote.vote == vote_type:
-        existing_vote.delete()
-        if vote_type == "upvote":
-            comment.upvotes -= 1
-        else:
-            comment.downvotes -= 1
-        comment.save()
-        return Response({"message": "Vote removed"})
-
-    if existing_vote:
-        if existing_vote.vote == "upvote":
-            comment.upvotes -= 1
-        else:
-            comment.downvotes -= 1
-        existing_vote.vote = vote_type
-        existing_vote.save()
-    else:
-        Comment_vote.objects.create(
-            user=request.user, comment=comment, vote=vote_type
-        )
-    if vote_type == "upvote":
-        comment.upvotes += 1
-    else:
-        comment.downvotes += 1
-    comment.save()
-    return Response({"upvotes": comment.upvotes, "downvotes": comment.downvotes}, status=status.HTTP_200_OK)
+    if vote_type not in VOTE_FIELDS:
+        return Response({"message": "Vote must be 'upvote' or 'downvote'."}, status=status.HTTP_400_BAD_REQUEST)
+    result = toggle_vote(request.user, comment_id, vote_type)
+    if result is None:
+        return Response({"message": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
+    removed, counts = result
+    if removed:
+        return Response({"message": "Vote removed", **counts})
+    return Response(counts, status=status.HTTP_200_OK)
 
 
 
@@ -199,20 +267,13 @@ def votes_comment(request, comment_id):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def book_review(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
-    existing_review = BookReview.objects.filter(book=book, reviewer=request.user).first()
-    if existing_review:
-        book.rating -= 1
-        book.save()
-        existing_review.delete()
-        return Response({"rating": book.rating}, status=status.HTTP_200_OK)
-    
-    BookReview.objects.create(book=book, reviewer=request.user)
-    book.rating += 1
-    book.save()
-    return Response({"rating": book.rating}, status=status.HTTP_201_CREATED)
+    result = toggle_review(request.user, book_id)
+    if result is None:
+        return Response({"message": "Book not found."}, status=status.HTTP_404_NOT_FOUND)
+    created, rating = result
+    return Response({"rating": rating}, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
 
 
@@ -220,111 +281,48 @@ def book_review(request, book_id):
 # borrower request view, accept/reject request, lender history, borrower history can be added here
 @api_view(["POST"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
+@rate_limit('borrow_request')
 def borrow_request(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
-    if book.owner == request.user:
-        return Response({"message":"You cannot request your own book."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    request_count = BorrowRequest.objects.filter(requester=request.user, status='ACCEPTED').count()
-    if request_count >= 2:
-        return Response({"message":"You have reached the maximum number of borrowed books (2)"}, status=status.HTTP_400_BAD_REQUEST)
-    
-    requested_book = BorrowRequest.objects.filter(book=book, status='ACCEPTED').first()
-    if requested_book:
-        return Response({"message":"This book is currently unavailable."}, status=status.HTTP_400_BAD_REQUEST)
-
-    existing_request = BorrowRequest.objects.filter(requester=request.user, book=book, status='PENDING').first()
-    if existing_request:
-        return Response({"message":"You have already requested this book."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    borrower_request = BorrowRequest.objects.create(
-        requester=request.user,
-        owner=book.owner,
-        book=book,
-        status='PENDING'
-    )
+    try:
+        borrower_request = borrowing.request_book(request.user, book_id)
+    except borrowing.BorrowError as exc:
+        return Response({"message": exc.message}, status=exc.status_code)
     serializer = BorrowRequestSerializer(borrower_request, context={'request': request})
-
-    borrower_mail = request.user.email
-    book_owner = book.owner.email
-    send_mail_to_lender(book_owner, borrower_mail, book.title)
     return Response({"message":"Borrower request created successfully.", "data": serializer.data}, status=status.HTTP_201_CREATED)
 
 
-# send email to lender when borrower request is created
-def send_mail_to_lender(recipient_email, borrower_email, book_title):
-    subject = "New Borrow Request"
-    message = f"You have a new borrow request for your book '{book_title}' from {borrower_email}."
-    from_email = borrower_email
-    recipient_list = recipient_email
-    body = message
-    mail = EmailMultiAlternatives(
-        subject=subject,
-        body=body,
-        from_email=from_email,
-        to=[recipient_list],
-    )
-    mail.send(fail_silently=False)    
-
-
 @api_view(["DELETE"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def cancel_borrow_request(request, request_id):
-    borrow_request = get_object_or_404(BorrowRequest, id=request_id, requester=request.user)
-    if borrow_request.status != 'PENDING':
-        return Response({"message":"This request has already been processed."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    borrow_request.status = 'CANCELLED'
-    borrow_request.delete()
+    try:
+        borrowing.cancel(request_id, request.user)
+    except borrowing.BorrowError as exc:
+        return Response({"message": exc.message}, status=exc.status_code)
     return Response({"message":"Borrow request cancelled."}, status=status.HTTP_200_OK)
 
 
 @api_view(["PATCH"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def accept_borrow_request(request, request_id):
-    borrow_request = get_object_or_404(BorrowRequest, id=request_id)
-
-
-    if borrow_request.status != 'PENDING':
-        return Response({"message":"This request has already been processed."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    if borrow_request.owner != request.user:
-        return Response({"message":"You are not authorized to accept this request."}, status=status.HTTP_403_FORBIDDEN)
-    
-    if BorrowRequest.objects.filter(book=borrow_request.book, status='ACCEPTED').exists():
-        return Response({"message":"This book has already been accepted for borrowing."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    
-    borrow_request.status = 'ACCEPTED'
-    borrow_request.accepted_at = timezone.now()
-    borrow_request.return_date = timezone.now() + timezone.timedelta(days=14)  
-
-    borrow_request.requester.is_borrower = True
-    borrow_request.owner.is_lender = True
-
-    borrow_request.requester.save()
-    borrow_request.owner.save()
-    borrow_request.save()
+    try:
+        borrow_request = borrowing.accept(request_id, request.user)
+    except borrowing.BorrowError as exc:
+        return Response({"message": exc.message}, status=exc.status_code)
     serializer = BorrowRequestSerializer(borrow_request)
     return Response({"message":"Borrow request accepted.", "data": serializer.data}, status=status.HTTP_200_OK)
 
 
 @api_view(["DELETE"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def reject_borrow_request(request, request_id):
-    borrow_request = get_object_or_404(BorrowRequest, id=request_id)
-    if borrow_request.status != 'PENDING':
-        return Response({"message":"This request has already been processed."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    if borrow_request.owner != request.user:
-        return Response({"message":"You are not authorized to reject this request."}, status=status.HTTP_403_FORBIDDEN)
-    
-    borrow_request.status = 'REJECTED'
-    borrow_request.delete()
+    try:
+        borrow_request = borrowing.reject(request_id, request.user)
+    except borrowing.BorrowError as exc:
+        return Response({"message": exc.message}, status=exc.status_code)
     serializer = BorrowRequestSerializer(borrow_request)
     return Response({"message":"Borrow request rejected.", "data": serializer.data}, status=status.HTTP_200_OK)       
 
@@ -347,50 +345,49 @@ def reject_borrow_request(request, request_id):
 
 
 
+def history_queryset(**filters):
+    counterpart = 'owner' if 'requester' in filters else 'requester'
+    return (
+        BorrowRequest.objects.filter(**filters)
+        .select_related('book', counterpart)
+        .only(
+            'id', 'status', 'created_at', 'accepted_at', 'return_date', 'is_late',
+            'book', 'book__id', 'book__title', 'book__book_image',
+            counterpart, f'{counterpart}__id', f'{counterpart}__name',
+        )
+        .order_by('-created_at', '-id')
+    )
+
+
 # borrower history
 @api_view(["GET"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def borrow_request_page(request):
-    borrow_requests = BorrowRequest.objects.filter(requester=request.user).order_by('-created_at')
-    serializer = BorrowRequestSerializer(borrow_requests, many=True)
+    borrow_requests = history_queryset(requester=request.user)
+    serializer = BorrowHistorySerializer(borrow_requests, many=True)
     return Response({"data": serializer.data}, status=status.HTTP_200_OK)
 
 
 # lender history
 @api_view(["GET"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def lend_request_page(request):
-    lend_requests = BorrowRequest.objects.filter(owner=request.user).order_by('-created_at')
-    serializer = BorrowRequestSerializer(lend_requests, many=True)
+    lend_requests = history_queryset(owner=request.user)
+    serializer = LendHistorySerializer(lend_requests, many=True)
     return Response({"data": serializer.data}, status=status.HTTP_200_OK)
 
 
 # return borrowed book to lender
 @api_view(["PATCH"])
 @permission_classes([IsAuthenticated, IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def return_book(request, request_id):
-    borrow_request = get_object_or_404(BorrowRequest, id=request_id)
-    if borrow_request.requester != request.user:
-        return Response({"message":"You are not authorized to return this book."}, status=status.HTTP_403_FORBIDDEN)
-    if borrow_request.status != 'ACCEPTED':
-        return Response({"message": "This book you have not borrowed yet."}, status=status.HTTP_400_BAD_REQUEST)
-    
-    borrow_request.status = 'RETURNED'
-    if timezone.now() > borrow_request.return_date:
-        borrow_request.is_late = True
-
-    borrow_request.save()
-    still_active_borrower = BorrowRequest.objects.filter(
-        requester=request.user,
-        status='ACCEPTED'
-    ).exists()
-
-    if not still_active_borrower:
-        request.user.is_borrower = False
-        request.user.save()
+    try:
+        borrow_request = borrowing.return_loan(request_id, request.user)
+    except borrowing.BorrowError as exc:
+        return Response({"message": exc.message}, status=exc.status_code)
 
     serializer = BorrowRequestSerializer(borrow_request)
     return Response(
@@ -401,10 +398,10 @@ def return_book(request, request_id):
 
 @api_view(["GET"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def my_requests(request):
-    requests = BorrowRequest.objects.filter(requester=request.user)
-    serializer = BorrowRequestSerializer(requests, many=True)
+    requests = history_queryset(requester=request.user)
+    serializer = BorrowHistorySerializer(requests, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -412,7 +409,7 @@ def my_requests(request):
 # books count
 @api_view(["GET"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def books_count(request):
     total_books = Book.objects.filter(owner=request.user).count()
     return Response({"total_books": total_books}, status=status.HTTP_200_OK)
@@ -420,7 +417,7 @@ def books_count(request):
 
 @api_view(["GET"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def borrowed_books_count(request):
     borrowed_books = BorrowRequest.objects.filter(requester=request.user, status='ACCEPTED').count()
     return Response({"borrowed_books": borrowed_books}, status=status.HTTP_200_OK)
@@ -428,7 +425,7 @@ def borrowed_books_count(request):
 
 @api_view(["GET"])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def lent_books_count(request):
     lent_books = BorrowRequest.objects.filter(owner=request.user, status='ACCEPTED').count()
     return Response({"lent_books": lent_books}, status=status.HTTP_200_OK)
@@ -438,7 +435,7 @@ def lent_books_count(request):
 # add book to wishlist
 @api_view(['POST'])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def add_to_wishlist(request, book_id):
     book = get_object_or_404(Book, id=book_id)
     wishlist_entry, _ = WishList.objects.get_or_create(user=request.user, book=book)
@@ -448,16 +445,16 @@ def add_to_wishlist(request, book_id):
 
 @api_view(['GET'])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def wishlist(request):
-    wishlist = WishList.objects.filter(user=request.user)
+    wishlist = WishList.objects.filter(user=request.user).select_related('user', 'book')
     serializer = WishListSerializer(wishlist, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 @api_view(['DELETE'])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def remove_from_wishlist(request, book_id):
     book = get_object_or_404(Book, id=book_id)
     wishlist_entry = WishList.objects.filter(user=request.user, book=book).first()
@@ -470,17 +467,17 @@ def remove_from_wishlist(request, book_id):
 #list of borrow and lend requests
 @api_view(['GET'])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def borrow_request_list(request):
-    borrow_requests = BorrowRequest.objects.filter(requester=request.user).order_by('-created_at')
-    serializer = BorrowRequestSerializer(borrow_requests, many=True)
+    borrow_requests = history_queryset(requester=request.user)
+    serializer = BorrowHistorySerializer(borrow_requests, many=True)
     return Response({"data": serializer.data}, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([IsActiveUser])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([CachedJWTAuthentication])
 def lend_request_list(request):
-    lend_requests = BorrowRequest.objects.filter(owner=request.user).order_by('-created_at')
-    serializer = BorrowRequestSerializer(lend_requests, many=True)
+    lend_requests = history_queryset(owner=request.user)
+    serializer = LendHistorySerializer(lend_requests, many=True)
     return Response({"data": serializer.data}, status=status.HTTP_200_OK)
\ No newline at end of file
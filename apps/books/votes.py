@@ -0,0 +1,168 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Comment, Comment_vote
+
+
+logger = logging.getLogger(__name__)
+
+VOTE_FIELDS = {'upvote': 'upvotes', 'downvote': 'downvotes'}
+
+
+def apply_counter_deltas(deltas):
+    """
+    Apply ``{comment_id: {'upvotes': n, 'downvotes': m}}`` as F() increments,
+    one UPDATE per field for the whole batch. Returns the updated row count.
+    Counters are clamped at 0: a decrement on a counter that drifted low
+    would otherwise trip the PositiveIntegerField CHECK.
+    """
+    updated = 0
+    for field in VOTE_FIELDS.values():
+        whens = [When(pk=pk, then=Value(delta[field])) for pk, delta in deltas.items() if delta.get(field)]
+        if not whens:
+            continue
+        ids = [pk for pk, delta in deltas.items() if delta.get(field)]
+        updated = max(updated, Comment.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + Case(*whens, default=Value(0)), Value(0))}
+        ))
+    return updated
+
+
+class VoteCounterBuffer:
+    """
+    Write-behind buffer for comment vote counters. Vote rows are still
+    written synchronously, only the counter deltas are accumulated in memory
+    and flushed in batches every ``flush_seconds`` or ``flush_size`` comments.
+    A daemon timer flushes quiet buffers too, so at most ``flush_seconds``
+    of deltas are lost if the process is killed without running atexit.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.timer = None
+
+    @property
+    def flush_seconds(self):
+        return getattr(settings, 'COMMENT_VOTE_FLUSH_SECONDS', 2)
+
+    def add(self, comment_id, delta):
+        with self.lock:
+            current = self.pending.setdefault(comment_id, {field: 0 for field in VOTE_FIELDS.values()})
+            for field, value in delta.items():
+                current[field] += value
+            if self.timer is None:
+                self.timer = threading.Thread(target=self._tick, name='comment-vote-flush', daemon=True)
+                self.timer.start()
+        if self._due():
+            self.flush()
+
+    def _tick(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing comment vote counters failed, retrying in %ss", self.flush_seconds)
+            finally:
+                close_old_connections()
+
+    def pending_for(self, comment_id):
+        with self.lock:
+            return dict(self.pending.get(comment_id, {}))
+
+    def _due(self):
+        flush_size = getattr(settings, 'COMMENT_VOTE_FLUSH_SIZE', 500)
+        return len(self.pending) >= flush_size or time.monotonic() - self.flushed_at >= self.flush_seconds
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        if not batch:
+            return 0
+        try:
+            with transaction.atomic():
+                apply_counter_deltas(batch)
+        except Exception:
+            # put the deltas back so the next flush retries them
+            with self.lock:
+                for comment_id, delta in batch.items():
+                    current = self.pending.setdefault(comment_id, {field: 0 for field in VOTE_FIELDS.values()})
+                    for field, value in delta.items():
+                        current[field] += value
+            raise
+        return len(batch)
+
+
+vote_buffer = VoteCounterBuffer()
+atexit.register(lambda: vote_buffer.flush())
+
+
+def write_behind_enabled():
+    return getattr(settings, 'COMMENT_VOTE_WRITE_BEHIND', False)
+
+
+def toggle_vote(user, comment_id, vote_type):
+    """
+    Toggle ``user``'s vote on a comment: voting the same way again removes
+    the vote, voting the other way switches it. The vote row and counter
+    deltas are written in one transaction; returns ``(removed, counts)``, or
+    ``None`` if the comment does not exist.
+    """
+    field = VOTE_FIELDS[vote_type]
+    for attempt in range(2):
+        try:
+            # sqlite ignores the row lock, there the IMMEDIATE transaction
+            # (see DATABASES) serialises toggles instead
+            with transaction.atomic():
+                existing = (
+                    Comment_vote.objects.select_for_update()
+                    .filter(user=user, comment_id=comment_id)
+                    .only('id', 'vote')
+                    .first()
+                )
+                delta = {}
+                removed = bool(existing and existing.vote == vote_type)
+                if removed:
+                    existing.delete()
+                    delta[field] = -1
+                elif existing:
+                    delta[VOTE_FIELDS[existing.vote]] = -1
+                    delta[field] = 1
+                    existing.vote = vote_type
+                    existing.save(update_fields=['vote', 'updated_at'])
+                else:
+                    Comment_vote.objects.create(user=user, comment_id=comment_id, vote=vote_type)
+                    delta[field] = 1
+
+                # the counter UPDATE doubles as the "comment exists" check
+                if write_behind_enabled():
+                    found = Comment.objects.filter(pk=comment_id).exists()
+                    transaction.on_commit(lambda: vote_buffer.add(comment_id, delta))
+                else:
+                    found = apply_counter_deltas({comment_id: delta})
+                if not found:
+                    transaction.set_rollback(True)
+                    return None
+            break
+        except IntegrityError:
+            # a concurrent first vote by the same user won the insert, retry
+            # against the row it created
+            if attempt:
+                raise
+
+    counts = Comment.objects.filter(pk=comment_id).values(*VOTE_FIELDS.values()).first()
+    if counts is None:
+        return None
+    for pending_field, value in vote_buffer.pending_for(comment_id).items():
+        counts[pending_field] += value
+    return removed, counts
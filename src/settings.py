@@ -95,6 +95,24 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'src.wsgi.application'
+ASGI_APPLICATION = 'src.asgi.application'
+
+# Route the hot read endpoints and signin to their async views, for uvicorn
+# deployments (see docs/asgi.md). Keep off under sync gunicorn workers.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+# Threads verifying passwords for the async signin, defaults to the CPU count
+PASSWORD_HASH_THREADS = None
+
+# Channel layer for the WebSocket notifications (ws/notifications/). The
+# in-memory layer only reaches sockets in the same process; with several
+# processes use a shared layer, e.g. channels_redis:
+# CHANNEL_LAYERS = {'default': {
+#     'BACKEND': 'channels_redis.core.RedisChannelLayer',
+#     'CONFIG': {'hosts': [('127.0.0.1', 6379)]},
+# }}
+CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
 
 
 # Database
@@ -104,6 +122,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # take the write lock at BEGIN: a deferred transaction that reads and
+        # then writes fails with "database is locked" instead of waiting when
+        # another writer got in between
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # a file rather than shared-cache memory, so threaded tests get
+        # sqlite's real locking (shared cache fails instead of waiting)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -191,3 +216,78 @@ STORAGES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+
+
+# Book listing pagination
+BOOK_PAGE_SIZE = 20
+BOOK_MAX_PAGE_SIZE = 100
+
+# Full-text search engine behind book_search, defaults to SQLite FTS5 on sqlite
+# BOOK_SEARCH_BACKEND = 'apps.books.search.SQLiteFTS5Backend'
+
+# In-process autocomplete index, compact mode keeps two entries per book and
+# loads titles for the matches from the database
+BOOK_AUTOCOMPLETE_COMPACT = False
+BOOK_AUTOCOMPLETE_REFRESH_SECONDS = 30
+
+# Comment threads deeper than this are cut off with a "load more replies" link
+BOOK_COMMENT_MAX_DEPTH = 4
+
+# Cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # "default": {
+    #     "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    #     "LOCATION": os.path.join(BASE_DIR, 'cache'),
+    # },
+}
+
+# Tag-invalidated response cache for the public catalog endpoints. Off while
+# the alias is process-local (locmem): purges wouldn't reach other workers
+BOOK_RESPONSE_CACHE = 'default'
+BOOK_RESPONSE_CACHE_TIMEOUT = 300
+
+# Authenticated users are cached in BOOK_RESPONSE_CACHE for this many seconds,
+# every User save invalidates them. Skipped while that cache is process-local
+# (locmem), where another worker would miss the invalidation
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Rate limits for auth and write endpoints, see apps/accounts/ratelimit.py.
+# Counters must be shared by all workers: SQLiteBackend on a local file, or
+# CacheBackend over a shared cache alias (RATE_LIMIT_CACHE) across hosts.
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_BACKEND = 'apps.accounts.ratelimit.SQLiteBackend'
+RATE_LIMIT_SQLITE_PATH = BASE_DIR / 'ratelimit.sqlite3'
+# RATE_LIMIT_BACKEND = 'apps.accounts.ratelimit.CacheBackend'
+# RATE_LIMIT_CACHE = 'default'
+# RATE_LIMIT_IP_HEADER = 'HTTP_X_FORWARDED_FOR'  # only behind a trusted proxy
+# RATE_LIMITS = {'signin': [('ip', 20, 60), ('email', 5, 300)]}
+
+# Borrowing rules, enforced in apps/books/borrowing.py
+BORROW_MAX_ACTIVE_LOANS = 2
+BORROW_LOAN_DAYS = 14
+
+# Comment vote counters, write-behind buffers deltas in memory and flushes in batches
+COMMENT_VOTE_WRITE_BEHIND = False
+COMMENT_VOTE_FLUSH_SECONDS = 2
+COMMENT_VOTE_FLUSH_SIZE = 500
+
+# Email outbox, drained by `manage.py send_outbox_emails --loop`
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF_SECONDS = 30
+
+# Background download of covers submitted as image_url
+BOOK_IMAGE_INGEST_IN_PROCESS = True
+BOOK_IMAGE_INGEST_THREADS = 4
+BOOK_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+# width x height, checked from the header before any pixels are decoded
+BOOK_IMAGE_MAX_PIXELS = 25_000_000
+BOOK_IMAGE_TIMEOUT = 10
+BOOK_IMAGE_MAX_REDIRECTS = 3
+# only for local development against a private image host
+BOOK_IMAGE_ALLOW_PRIVATE_HOSTS = False
+
+# Responsive cover variants (name -> width), generated next to each upload
+BOOK_COVER_SIZES = {'thumb': 160, 'medium': 480}